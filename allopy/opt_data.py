@@ -61,6 +61,8 @@ class OptData(np.ndarray):
 
         # minor optimization when using rebalanced optimization. This is essentially a cache
         self._unrebalanced_returns_data: Optional[np.ndarray] = None
+        self._tail_cache: Optional[tuple] = None
+        self._cov_factor_cache: Optional[tuple] = None
         self._cov_mat = cov_mat
 
     def __array_finalize__(self, obj):
@@ -71,7 +73,18 @@ class OptData(np.ndarray):
         self.time_unit = getattr(obj, 'time_unit', 12)
         self.n_years = getattr(obj, 'n_years', 0)
         self.n_assets = getattr(obj, 'n_assets', 0)
-        self._unrebalanced_returns_data = getattr(obj, '_unrebalanced_returns_data', None)
+        # slices and ufunc results hold different data, so the cached returns cannot be carried over
+        self._clear_cache()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._clear_cache()
+
+    def _clear_cache(self):
+        """Drops the results derived from the data. Must be called whenever the data is modified in place"""
+        self._unrebalanced_returns_data = None
+        self._tail_cache = None
+        self._cov_factor_cache = None
 
     def aggregate_assets(self, w: Iterable[float], columns: Optional[Iterable[float]] = None, copy=True):
         """
@@ -194,6 +207,7 @@ class OptData(np.ndarray):
             an instance of :class:`OptData`
         """
         if inplace:
+            self._clear_cache()
             return calibrate_data(self, mean, sd, self.time_unit, True)
         return OptData(calibrate_data(self, mean, sd, self.time_unit), self.time_unit)
 
@@ -233,7 +247,12 @@ class OptData(np.ndarray):
             A new instance of the cut :class:`OptData`
         """
         limit = int(years * self.time_unit)
-        data = deepcopy(self)[:limit] if copy else self[:limit]
+        if copy:
+            # only the kept periods are copied, not the whole tensor
+            data = self[:limit].copy()
+            data._cov_mat = deepcopy(self._cov_mat)
+        else:
+            data = self[:limit]
         data.n_years = years
         return data
 
@@ -276,9 +295,42 @@ class OptData(np.ndarray):
         assert 0 <= percentile <= 100, "Percentile must be a number between [0, 100]"
         w = _format_weights(w, self)
 
-        returns = self.portfolio_returns(w, rebalance)
-        cutoff = np.percentile(returns, percentile)
-        return float(returns[returns <= cutoff].mean())
+        returns, tail = self._tail(w, rebalance, percentile)
+        return float(returns[tail].mean())
+
+    def cvar_gradient(self, w: Array, rebalance: bool, percentile=5.0) -> np.ndarray:
+        r"""
+        Calculates the gradient of the CVaR with respect to the weights.
+
+        The trials in the tail are held fixed, thus the gradient is the average of the derivatives of the portfolio
+        returns over the trials that are below the percentile cutoff.
+
+        Parameters
+        ----------
+        w: {iterable float, ndarray}
+            Portfolio weights
+
+        rebalance: bool
+            Whether portfolio is rebalanced every time period
+
+        percentile: float, default 5.0
+            The percentile to cutoff for CVaR calculation
+
+        Returns
+        -------
+        ndarray
+            Gradient of the CVaR
+
+        See Also
+        --------
+        :py:meth:`.cvar` : CVaR
+        :py:meth:`.portfolio_returns_jacobian` : Derivatives of the portfolio returns
+        """
+        assert 0 <= percentile <= 100, "Percentile must be a number between [0, 100]"
+        w = _format_weights(w, self)
+
+        _, tail = self._tail(w, rebalance, percentile)
+        return self.portfolio_returns_jacobian(w, rebalance)[tail].mean(0)
 
     def expected_return(self, w: Array, rebalance: bool):
         r"""
@@ -315,6 +367,42 @@ class OptData(np.ndarray):
 
         return (np.sign(returns) * np.abs(returns) ** (1 / self.n_years)).mean() - 1
 
+    def expected_return_gradient(self, w: Array, rebalance: bool) -> np.ndarray:
+        r"""
+        Calculates the gradient of the annualized expected return with respect to the weights. The gradient is
+        given by
+
+        .. math::
+
+            \nabla \mu_R = \frac{1}{N} \sum^N_i \frac{1}{y} |r_i|^{1/y - 1} \nabla r_i
+
+        where :math:`r` is an instance of the geometric returns vector and :math:`y` is the number of years.
+
+        Parameters
+        ----------
+        w: {iterable float, ndarray}
+            Portfolio weights
+
+        rebalance: bool
+            Whether portfolio is rebalanced every time period
+
+        Returns
+        -------
+        ndarray
+            Gradient of the annualized return
+
+        See Also
+        --------
+        :py:meth:`.expected_return` : Expected returns
+        :py:meth:`.portfolio_returns_jacobian` : Derivatives of the portfolio returns
+        """
+        w = _format_weights(w, self)
+        returns = self.portfolio_returns(w, rebalance) + 1
+
+        power = 1 / self.n_years
+        scale = power * np.abs(returns) ** (power - 1)
+        return scale @ self.portfolio_returns_jacobian(w, rebalance) / len(returns)
+
     def sharpe_ratio(self, w: Array, rebalance: bool) -> float:
         r"""
         Calculates the portfolio sharpe ratio.
@@ -351,6 +439,32 @@ class OptData(np.ndarray):
 
         return e / v
 
+    def sharpe_ratio_gradient(self, w: Array, rebalance: bool) -> np.ndarray:
+        r"""
+        Calculates the gradient of the portfolio sharpe ratio with respect to the weights
+
+        Parameters
+        ----------
+        w: {iterable float, ndarray}
+            Portfolio weights
+
+        rebalance: bool
+            Whether portfolio is rebalanced every time period
+
+        Returns
+        -------
+        ndarray
+            Gradient of the sharpe ratio
+
+        See Also
+        --------
+        :py:meth:`.sharpe_ratio` : Sharpe ratio
+        """
+        w = _format_weights(w, self)
+        e, v = self.expected_return(w, rebalance), self.volatility(w)
+
+        return (self.expected_return_gradient(w, rebalance) * v - e * self.volatility_gradient(w)) / v ** 2
+
     def volatility(self, w: Array) -> float:
         r"""
         Calculates the volatility of the portfolio given a weight vector. The volatility is given by:
@@ -373,7 +487,36 @@ class OptData(np.ndarray):
         """
         w = _format_weights(w, self)
 
-        return float(w.T @ self.cov_mat @ w) ** 0.5
+        return float(np.linalg.norm(self._cov_factor().T @ w))
+
+    def volatility_gradient(self, w: Array) -> np.ndarray:
+        r"""
+        Calculates the gradient of the volatility with respect to the weights. The gradient is given by
+
+        .. math::
+
+            \frac{\Sigma \cdot \mathbf{w}}{\sqrt{\mathbf{w} \cdot \Sigma \cdot \mathbf{w^T}}}
+
+        Parameters
+        ----------
+        w: {iterable float, ndarray}
+            Portfolio weights
+
+        Returns
+        -------
+        ndarray
+            Gradient of the volatility
+
+        See Also
+        --------
+        :py:meth:`.volatility` : Volatility
+        """
+        w = _format_weights(w, self)
+        factor = self._cov_factor()
+
+        lw = factor.T @ w
+        vol = float(np.linalg.norm(lw))
+        return factor @ lw / vol if vol > 0 else np.zeros(len(w))
 
     def portfolio_returns(self, w: Array, rebalance: bool) -> np.ndarray:
         r"""
@@ -410,11 +553,88 @@ class OptData(np.ndarray):
             vector of portfolio returns
         """
         if rebalance:
-            return (self @ w + 1).prod(0) - 1
+            # computed on a plain ndarray view to skip the OptData ufunc wrapping on the intermediate tensors
+            return (np.asarray(self) @ w + 1).prod(0) - 1
         else:
-            if self._unrebalanced_returns_data is None:  # cache this calculation
-                self._unrebalanced_returns_data = np.asarray((self + 1).prod(0) - 1)
-            return self._unrebalanced_returns_data @ w
+            return self._cumulative_returns() @ w
+
+    def portfolio_returns_jacobian(self, w: Array, rebalance: bool) -> np.ndarray:
+        r"""
+        Calculates the derivatives of the geometric returns of every trial with respect to the portfolio weights.
+
+        If there is no rebalancing, the geometric returns are linear in the weights and the jacobian is the cumulative
+        returns of each asset, :math:`\prod^T (\mathbf{R_i} + 1) - 1`. Otherwise, the derivative for trial :math:`i`
+        is given by:
+
+        .. math::
+
+            \frac{\partial r_i}{\partial \mathbf{w}} = (r_i + 1) \sum^T \frac{\mathbf{R_{ti}}}
+            {\mathbf{R_{ti}} \cdot \mathbf{w} + 1}
+
+        Parameters
+        ----------
+        w: array_like
+            Portfolio weights
+
+        rebalance: bool
+            Whether portfolio is rebalanced every time period
+
+        Returns
+        -------
+        ndarray
+            Matrix of derivatives where the rows are the trials and the columns are the assets
+
+        See Also
+        --------
+        :py:meth:`.portfolio_returns` : Portfolio returns
+        """
+        data = np.asarray(self)
+        if rebalance:
+            w = _format_weights(w, self)
+            growth = data @ w + 1
+            return np.einsum('tkn,tk->kn', data, 1 / growth) * growth.prod(0)[:, None]
+        else:
+            return self._cumulative_returns()
+
+    def _tail(self, w: np.ndarray, rebalance: bool, percentile: float):
+        """
+        Portfolio returns and the mask of the trials in the tail at or below the percentile. The CVaR and its gradient
+        are usually requested one after the other at the same weights, so the last result is kept and reused
+        """
+        key = (w.tobytes(), rebalance, percentile)
+        cache = getattr(self, '_tail_cache', None)
+        if cache is not None and cache[0] == key:
+            return cache[1], cache[2]
+
+        returns = np.asarray(self.portfolio_returns(w, rebalance))
+        tail = returns <= np.percentile(returns, percentile)
+        self._tail_cache = key, returns, tail
+        return returns, tail
+
+    def _cumulative_returns(self) -> np.ndarray:
+        """Cumulative returns of each asset in every trial. Cached as it does not depend on the weights"""
+        if self._unrebalanced_returns_data is None:
+            self._unrebalanced_returns_data = np.asarray((self + 1).prod(0) - 1)
+        return self._unrebalanced_returns_data
+
+    def _cov_factor(self) -> np.ndarray:
+        r"""
+        Factor :math:`L` of the covariance matrix where :math:`\Sigma = L L^T`. The volatility is then the norm of
+        :math:`L^T w` which never goes negative from round-off. Cached until a different covariance matrix is set
+        """
+        cached = getattr(self, '_cov_factor_cache', None)
+        if cached is None or cached[0] is not self._cov_mat:
+            cov = np.asarray(self._cov_mat, np.float64)
+            cov = (cov + cov.T) / 2
+            try:
+                factor = np.linalg.cholesky(cov)
+            except np.linalg.LinAlgError:
+                # semi-definite matrices have no Cholesky factor, use the eigen decomposition instead
+                values, vectors = np.linalg.eigh(cov)
+                factor = vectors * np.sqrt(np.clip(values, 0, None))
+            cached = self._cov_factor_cache = (self._cov_mat, factor)
+
+        return cached[1]
 
     def set_cov_mat(self, cov_mat: np.ndarray):
         """
@@ -544,6 +764,7 @@ class OptData(np.ndarray):
                 if isinstance(output, OptData):
                     out_no.append(j)
                     out_args.append(output.view(np.ndarray))
+                    output._clear_cache()  # data is modified in place
                 else:
                     out_args.append(output)
             kwargs['out'] = tuple(out_args)
@@ -623,6 +844,8 @@ class OptData(np.ndarray):
         self.n_years = meta['n_years']
         self.time_unit = meta['time_unit']
         self._unrebalanced_returns_data = meta['_unrebalanced_returns_data']
+        self._tail_cache = None
+        self._cov_factor_cache = None
 
         super(OptData, self).__setstate__(state[:-1], *args, **kwargs)
 
@@ -751,20 +974,22 @@ def coalesce_covariance_matrix(cov,
     return float(cov) if cov.size == 1 else near_psd(cov)
 
 
+# number of periods in a year for each frequency name
+_FREQUENCIES = {
+    **dict.fromkeys(('m', 'month', 'monthly'), 12),
+    **dict.fromkeys(('s', 'semi-annual', 'semi-annually'), 2),
+    **dict.fromkeys(('q', 'quarter', 'quarterly'), 4),
+    **dict.fromkeys(('y', 'a', 'year', 'annual', 'yearly', 'annually'), 1),
+}
+
+
 def translate_frequency(_freq: Union[str, int]) -> int:
     """Translates a given frequency to the integer equivalent with checks"""
     if isinstance(_freq, str):
-        _freq_ = _freq.lower()
-        if _freq_ in ('m', 'month', 'monthly'):
-            return 12
-        elif _freq_ in ('s', 'semi-annual', 'semi-annually'):
-            return 6
-        elif _freq_ in ('q', 'quarter', 'quarterly'):
-            return 4
-        elif _freq_ in ('y', 'a', 'year', 'annual', 'yearly', 'annually'):  # year
-            return 1
-        else:
-            raise ValueError(f'unknown frequency {_freq}. Use one of month, semi-annual, quarter or annual')
+        try:
+            return _FREQUENCIES[_freq.lower()]
+        except KeyError:
+            raise ValueError(f'unknown frequency {_freq}. Use one of month, semi-annual, quarter or annual') from None
 
     assert isinstance(_freq, int) and _freq > 0, 'frequency can only be a positive integer or a string name'
     return _freq
@@ -1,4 +1,4 @@
-from typing import Union
+from enum import Enum
 
 from nlopt import *
 
@@ -47,11 +47,18 @@ __all__ = [
     "LD_CCSAQ",
     "GN_ESCH",
     "GN_AGS",
+    "GradientSupport",
     "map_algorithm",
     "has_gradient"
 ]
 
 
+class GradientSupport(Enum):
+    COMPILED_WITH_GRAD = 1
+    COMPILED_NO_GRAD = 2
+    NOT_COMPILED = 3
+
+
 def map_algorithm(algorithm):
     """
     Maps the string name of an algorithm to it's nlopt equivalent
@@ -114,13 +121,14 @@ def map_algorithm(algorithm):
     }[algorithm]
 
 
-def has_gradient(algorithm) -> Union[str, bool]:
+def has_gradient(algorithm) -> GradientSupport:
+    """Describes whether the nlopt algorithm is compiled and, if so, whether it uses the gradient"""
     desc: str = algorithm_name(algorithm)
 
     if desc.endswith('(NOT COMPILED)'):
-        return 'NOT COMPILED'
+        return GradientSupport.NOT_COMPILED
 
-    if 'no-derivative' in desc:
-        return False
+    if 'no-derivative' not in desc and ('derivative-based' in desc or 'derivative)' in desc):
+        return GradientSupport.COMPILED_WITH_GRAD
 
-    return 'derivative-based' in desc or 'derivative)' in desc
+    return GradientSupport.COMPILED_NO_GRAD
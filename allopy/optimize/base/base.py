@@ -1,6 +1,8 @@
-import inspect
+import os
+import threading
 import warnings
-from typing import Callable, Optional, Union
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, Union
 
 import nlopt as nl
 import numpy as np
@@ -13,13 +15,19 @@ from .constraint import ConstraintFunc, ConstraintMap
 from .initial_points import InitialPointGenerator
 from .result import Result
 from .summary import Summary
-from ..algorithms import LD_SLSQP, has_gradient, map_algorithm
+from ..algorithms import GradientSupport, LD_SLSQP, has_gradient, map_algorithm
 from ..utils import *
+from ..utils import _count_parameters
 
 __all__ = ['BaseOptimizer']
 
 Tolerance = Union[int, float, np.ndarray, None]
 
+# copy of the NLopt model which the current thread is running, if any. NLopt's copies do not stop nor re-raise when a
+# callback raises, so the callbacks record the error and stop the copy themselves, see BaseOptimizer._guard_callback.
+# The callbacks also stop the copy once its run is cancelled, which is signalled by an optional threading.Event
+_worker_state = threading.local()
+
 
 class BaseOptimizer:
     def __init__(self, n: int, algorithm=LD_SLSQP, *args, **kwargs):
@@ -39,7 +47,18 @@ class BaseOptimizer:
             other arguments to setup the optimizer
 
         kwargs
-            other keyword arguments
+            other keyword arguments. :code:`auto_grad` sets whether numerical gradients are used for functions
+            without one. Set it to False if all functions take :code:`(x, grad)` and fill in their own gradient, the
+            functions are then passed to NLopt as is without inspecting their signature. :code:`fd_points` is the
+            number of points (2 or 4) in the central difference used for numerical gradients. :code:`gradient_method`
+            is either 'central' (default) for central differences or 'complex' for the complex step derivative, which
+            is exact to machine precision and needs one evaluation per variable but only suits functions that are
+            analytic in their (complex) input, i.e. without abs, max, sorting or comparisons, or 'batched' for
+            central differences where the functions are vectorized: given a 2D array with a point per row they return
+            a vector of values, so the whole stencil is evaluated in one call. :code:`n_jobs` sets the
+            number of threads used to compute numerical gradients, -1 uses all available cores. Call :code:`close()`
+            or use the optimizer as a context manager to shut the threads down. :code:`seed` seeds
+            the generator of the random starting points. :code:`verbose` prints the optimizer's operations if True.
         """
         if isinstance(algorithm, str):
             algorithm = map_algorithm(algorithm)
@@ -47,12 +66,32 @@ class BaseOptimizer:
         self._n = n
         self._model = nl.opt(algorithm, n, *args)
 
+        # bounds are read on every (re)start, so the arrays are cached until the bounds are set again
+        self._lb_cache: Optional[np.ndarray] = None
+        self._ub_cache: Optional[np.ndarray] = None
+
         has_grad = has_gradient(algorithm)
-        if has_grad == 'NOT COMPILED':
+        if has_grad is GradientSupport.NOT_COMPILED:
             raise NotImplementedError(f"Cannot use '{nl.algorithm_name(algorithm)}' as it is not compiled")
 
-        self._auto_grad: bool = kwargs.get('auto_grad', has_grad)
+        self._auto_grad: bool = kwargs.get('auto_grad', has_grad is GradientSupport.COMPILED_WITH_GRAD)
+
+        n_jobs = kwargs.get('n_jobs', 1)
+        if not isinstance(n_jobs, int) or not (n_jobs > 0 or n_jobs == -1):
+            raise ValueError('n_jobs must be an integer >= 1 or -1')
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self._executor = ThreadPoolExecutor(n_jobs) if n_jobs > 1 else None
+
+        self._fd_points: int = kwargs.get('fd_points', 2)
+        self._gradient_method: str = kwargs.get('gradient_method', 'central')
+        assert self._gradient_method in ('central', 'complex', 'batched'), \
+            "gradient_method must be one of 'central', 'complex' or 'batched'"
         self._eps = get_option('EPS.STEP')
+
+        # numerical gradient wrappers keyed by the function and every setting the wrapper captures. Builders of
+        # identically configured models may share this between the models so that a function used in all of them is
+        # only wrapped once
+        self._grad_funcs: Dict[Tuple[Callable, float, str, int, Optional[Executor]], Callable] = {}
         self._c_eps = get_option('EPS.CONSTRAINT')
         self.set_xtol_abs(get_option('EPS.X_ABS'))
         self.set_xtol_rel(get_option('EPS.X_REL'))
@@ -60,11 +99,38 @@ class BaseOptimizer:
         self.set_ftol_rel(get_option('EPS.F_REL'))
         self.set_maxeval(get_option('MAX.EVAL'))
 
+        # returned (as a copy) when no solution is found
+        self._nan_buf = np.full(n, np.nan)
+
+        # last point the objective was evaluated at. Kept so that a failed run can be restarted from where it stopped
+        self._last_x = np.full(n, np.nan)
+
+        # generator for the random starting points, reseeded whenever a random state is given
+        self._rng = np.random.default_rng(kwargs.get('seed', None))
+
         self._cmap = ConstraintMap()
         self._result = Result()
         self._max_or_min = None
         self._verbose = kwargs.get('verbose', False)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Shuts down the threads used to compute numerical gradients when :code:`n_jobs` is more than 1. The optimizer
+        can still be used afterwards, its numerical gradients are then computed sequentially
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            for fn in self._grad_funcs.values():
+                if getattr(fn, 'executor', None) is not None:
+                    fn.executor = None
+
     @property
     def model(self):
         """The underlying optimizer. Use this if you need to access lower level settings for the optimizer"""
@@ -73,7 +139,10 @@ class BaseOptimizer:
     @property
     def lower_bounds(self):
         """Lower bound of each variable"""
-        return np.asarray(self._model.get_lower_bounds(), np.float64)
+        if self._lb_cache is None:
+            self._lb_cache = np.asarray(self._model.get_lower_bounds(), np.float64)
+            self._lb_cache.setflags(write=False)
+        return self._lb_cache
 
     @lower_bounds.setter
     def lower_bounds(self, lb: OptNumeric):
@@ -82,7 +151,10 @@ class BaseOptimizer:
     @property
     def upper_bounds(self):
         """Upper bound of each variable"""
-        return np.asarray(self._model.get_upper_bounds(), np.float64)
+        if self._ub_cache is None:
+            self._ub_cache = np.asarray(self._model.get_upper_bounds(), np.float64)
+            self._ub_cache.setflags(write=False)
+        return self._ub_cache
 
     @upper_bounds.setter
     def upper_bounds(self, ub: OptNumeric):
@@ -147,25 +219,16 @@ class BaseOptimizer:
         ndarray
             Values of free variables at optimality
         """
-        assert x0 is not None or initial_solution is not None, \
-            "If initial vector is not specified, method for initial_solution must be specified"
-
-        if x0 is None:
-            x0 = self._initial_points(initial_solution, random_state)
-        else:  # keep x within bounds
-            x0 = np.asarray(x0)
-            x0[x0 > self.upper_bounds] = self.upper_bounds[x0 > self.upper_bounds]
-            x0[x0 < self.lower_bounds] = self.lower_bounds[x0 < self.lower_bounds]
+        x0 = self._starting_vector(x0, initial_solution, random_state)
 
+        self._reset_gradient_memos()
         sol = self._model.optimize(x0, *args)
         if sol is not None:
-            self._result.x = sol
-            self._result.set_constraints(self._cmap, self._eps)
-            return self._result.x
+            return self._set_solution(sol)
         else:
             if self._verbose:
                 print('No solution was found for the given problem. Check the summary() for more information')
-            return np.repeat(np.nan, len(x0))
+            return self._nan_buf.copy()
 
     def set_max_objective(self, fn: Callable, *args):
         """
@@ -188,7 +251,7 @@ class BaseOptimizer:
         """
         self._max_or_min = 'maximize'
         self._model.set_stopval(float('inf'))
-        self._model.set_max_objective(self._set_gradient(fn), *args)
+        self._model.set_max_objective(self._guard_callback(self._track_last_point(self._set_gradient(fn))), *args)
         self._result.obj_func = fn
 
         return self
@@ -214,7 +277,7 @@ class BaseOptimizer:
         """
         self._max_or_min = 'minimize'
         self._model.set_stopval(-float('inf'))
-        self._model.set_min_objective(self._set_gradient(fn), *args)
+        self._model.set_min_objective(self._guard_callback(self._track_last_point(self._set_gradient(fn))), *args)
         self._result.obj_func = fn
 
         return self
@@ -241,7 +304,7 @@ class BaseOptimizer:
         tol = self._c_eps if tol is None else tol
 
         self._cmap.add_inequality_constraint(fn)
-        self._model.add_inequality_constraint(self._set_gradient(fn), tol)
+        self._model.add_inequality_constraint(self._guard_callback(self._set_gradient(fn)), tol)
         return self
 
     def add_equality_constraint(self, fn: ConstraintFunc, tol=None):
@@ -266,7 +329,7 @@ class BaseOptimizer:
         tol = self._c_eps if tol is None else tol
 
         self._cmap.add_equality_constraint(fn)
-        self._model.add_equality_constraint(self._set_gradient(fn), tol)
+        self._model.add_equality_constraint(self._guard_callback(self._set_gradient(fn)), tol)
         return self
 
     def add_inequality_matrix_constraint(self, A, b, tol=None):
@@ -296,11 +359,10 @@ class BaseOptimizer:
         A, b = validate_matrix_constraints(A, b)
 
         for i, row, _b in zip(range(len(b)), A, b):
-            fn = create_matrix_constraint(row, _b, f"A_{i}")
-            self._cmap.add_inequality_constraint(fn)
+            self._cmap.add_inequality_constraint(create_matrix_constraint(row, _b, f"A_{i}"))
 
-            f = create_gradient_func(fn, self._eps)
-            self._model.add_inequality_constraint(f, tol)
+        # all rows are evaluated by a single vector-valued constraint
+        self._model.add_inequality_mconstraint(create_matrix_mconstraint(A, b), np.full(len(b), tol, np.float64))
 
         return self
 
@@ -331,11 +393,11 @@ class BaseOptimizer:
         Aeq, beq = validate_matrix_constraints(Aeq, beq)
 
         for i, row, _beq in zip(range(len(beq)), Aeq, beq):
-            fn = create_matrix_constraint(row, _beq, f"AEQ_{i}")
-            self._cmap.add_equality_constraint(fn)
+            self._cmap.add_equality_constraint(create_matrix_constraint(row, _beq, f"AEQ_{i}"))
 
-            f = create_gradient_func(fn, self._eps)
-            self._model.add_equality_constraint(f, tol)
+        # all rows are evaluated by a single vector-valued constraint
+        self._model.add_equality_mconstraint(create_matrix_mconstraint(Aeq, beq),
+                                             np.full(len(beq), tol, np.float64))
 
         return self
 
@@ -385,11 +447,14 @@ class BaseOptimizer:
             Own instance
         """
         if isinstance(lb, (int, float)):
-            lb = np.repeat(float(lb), self._n)
+            lb = np.full(self._n, lb, np.float64)
+        else:
+            lb = np.ascontiguousarray(lb, np.float64)
 
         assert len(lb) == self._n, f"Input vector length must be {self._n}"
 
-        self._model.set_lower_bounds(np.asarray(lb))
+        self._model.set_lower_bounds(lb)
+        self._lb_cache = None
         return self
 
     def set_upper_bounds(self, ub: Numeric):
@@ -408,11 +473,14 @@ class BaseOptimizer:
             Own instance
         """
         if isinstance(ub, (int, float)):
-            ub = np.repeat(float(ub), self._n)
+            ub = np.full(self._n, ub, np.float64)
+        else:
+            ub = np.ascontiguousarray(ub, np.float64)
 
         assert len(ub) == self._n, f"Input vector length must be {self._n}"
 
-        self._model.set_upper_bounds(np.asarray(ub))
+        self._model.set_upper_bounds(ub)
+        self._ub_cache = None
         return self
 
     def set_epsilon(self, eps: float):
@@ -608,23 +676,94 @@ class BaseOptimizer:
             smry.solution = r.x
         return smry
 
-    def _initial_points(self, method: str, random_state):
-        gen = InitialPointGenerator(self._n, self.lower_bounds, self.upper_bounds)
+    def _starting_vector(self, x0: OptArray, initial_solution: Optional[str], random_state: Optional[int]):
+        assert x0 is not None or initial_solution is not None, \
+            "If initial vector is not specified, method for initial_solution must be specified"
+
+        if random_state is not None:
+            self._rng = np.random.default_rng(random_state)
+
+        if x0 is None:
+            return self._initial_points(initial_solution)
+        else:  # keep x within bounds
+            x0 = np.asarray(x0)
+            x0[x0 > self.upper_bounds] = self.upper_bounds[x0 > self.upper_bounds]
+            x0[x0 < self.lower_bounds] = self.lower_bounds[x0 < self.lower_bounds]
+            return x0
+
+    def _set_solution(self, sol: np.ndarray):
+        self._result.x = sol
+        self._result.set_constraints(self._cmap, self._eps)
+        return self._result.x
+
+    @staticmethod
+    def _guard_callback(fn: Callable[[np.ndarray, np.ndarray], float]):
+        """
+        When a copy of the model is run (see :code:`_worker_state`), an error raised by the function is recorded and
+        the copy is stopped. The copy is also stopped once its run is cancelled. Otherwise, the error propagates
+        through NLopt as usual
+        """
+
+        def callback(x, grad):
+            model = getattr(_worker_state, 'model', None)
+            if model is None:
+                return fn(x, grad)
+
+            cancelled = getattr(_worker_state, 'cancelled', None)
+            if cancelled is not None and cancelled.is_set():
+                model.force_stop()
+                return np.nan
+
+            try:
+                return fn(x, grad)
+            except Exception as e:
+                _worker_state.error = e
+                model.force_stop()
+                return np.nan
+
+        return callback
+
+    def _track_last_point(self, fn: Callable[[np.ndarray, np.ndarray], float]):
+        last_x = self._last_x
+
+        def objective(x, grad):
+            np.copyto(last_x, x)
+            return fn(x, grad)
+
+        return objective
+
+    def _initial_points(self, method: str):
+        gen = InitialPointGenerator(self._n, self.lower_bounds, self.upper_bounds, self._rng)
 
         if method.lower() == "random":
-            return gen.random_starting_points(random_state)
+            return gen.random_starting_points()
         elif method.lower() == "min_constraint_norm":
             cmap = self._cmap
             return gen.min_constraint(cmap.equality.values(), cmap.inequality.values())
         else:
             raise ValueError(f"Unknown initial solution method '{method}'. Check the docs for valid methods")
 
+    def _reset_gradient_memos(self):
+        """Clears the last point memoized by the numerical gradient wrappers"""
+        for fn in self._grad_funcs.values():
+            reset = getattr(fn, 'reset', None)
+            if reset is not None:
+                reset()
+
     def _set_gradient(self, fn: ConstraintFunc):
         assert callable(fn), "Argument must be a function"
 
-        if self._auto_grad and len(inspect.signature(fn).parameters) == 1:
+        if self._auto_grad and _count_parameters(fn) == 1:
             if self._verbose:
                 print(f"Setting gradient for function: '{fn.__name__}'")
-            return create_gradient_func(fn, self._eps)
+            key = fn, self._eps, self._gradient_method, self._fd_points, self._executor
+            if key not in self._grad_funcs:
+                if self._gradient_method == 'complex':
+                    self._grad_funcs[key] = create_complex_step_gradient_func(fn)
+                else:
+                    batched = self._gradient_method == 'batched'
+                    self._grad_funcs[key] = create_gradient_func(fn, self._eps, self._executor, self._fd_points,
+                                                                 batched)
+            return self._grad_funcs[key]
         else:
             return fn
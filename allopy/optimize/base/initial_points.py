@@ -1,19 +1,22 @@
-from typing import Callable, List
+from typing import Callable, List, Optional
 
 import numpy as np
 
 
 class InitialPointGenerator:
-    def __init__(self, n: int, lb: np.ndarray, ub: np.ndarray):
+    def __init__(self, n: int, lb: np.ndarray, ub: np.ndarray, rng: Optional[np.random.Generator] = None):
         self.n = n
         self.lb = lb
         self.ub = ub
+        self.rng = np.random.default_rng() if rng is None else rng
 
     def random_starting_points(self, random_state: int = None):
         if random_state is not None:
-            np.random.seed(random_state)
+            self.rng = np.random.default_rng(random_state)
 
-        return np.random.uniform(self.lb, self.ub)
+        assert np.isfinite(self.lb).all() and np.isfinite(self.ub).all(), \
+            "bounds must be finite to generate random starting points. Set the bounds or specify the initial vector"
+        return self.rng.uniform(self.lb, self.ub)
 
     def min_constraint(self, eq_cons: List[Callable[[np.ndarray], float]],
                        ineq_cons: List[Callable[[np.ndarray], float]]):
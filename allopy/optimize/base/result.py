@@ -1,10 +1,10 @@
-import inspect
 from typing import Callable, List, Optional
 
 import numpy as np
 
 from allopy import get_option
 from .constraint import ConstraintMap
+from ..utils import _count_parameters
 
 
 class Result:
@@ -20,7 +20,7 @@ class Result:
     @property
     def obj_value(self):
         assert self.obj_func is not None
-        if len(inspect.signature(self.obj_func).parameters) == 1:
+        if _count_parameters(self.obj_func) == 1:
             return self.obj_func(self.x)
 
         return self.obj_func(self.x, np.ones((len(self.x), len(self.x))))
@@ -55,7 +55,7 @@ class Result:
         for eq, c_map in [("<=", constraints.inequality),
                           ("=", constraints.equality)]:
             for name, f in c_map.items():
-                if len(inspect.signature(f).parameters) == 1:
+                if _count_parameters(f) == 1:
                     v = f(self.x) / get_option("C.SCALE")
                 else:  # at most 2 parameters
                     v = f(self.x, np.ones((len(self.x), len(self.x)))) / get_option("C.SCALE")
@@ -1,16 +1,24 @@
+import os
+import threading
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from typing import Optional, Union
 from typing import TypeVar
 
+import nlopt as nl
 import numpy as np
-from nlopt import RoundoffLimited
+from nlopt import ForcedStop, RoundoffLimited
+from scipy.stats import qmc
 
-from allopy import OptData, get_option
+from allopy import OptData, get_option, translate_frequency
 from allopy.penalty import NoPenalty, Penalty
 from allopy.types import OptArray
 from .summary import PortfolioSummary
 from ..algorithms import LD_SLSQP
 from ..base import BaseOptimizer
+from ..base.base import _worker_state
+from ..utils import project_to_simplex, sum_equal_1
 
 __all__ = ['AbstractPortfolioOptimizer', 'AbstractObjectiveBuilder', 'AbstractConstraintBuilder']
 
@@ -43,8 +51,8 @@ class AbstractPortfolioOptimizer(BaseOptimizer, ABC):
 
         cvar_data: {ndarray, OptData}
             The cvar_data data used as constraint during the optimization. If this is not set, will default to being a
-            copy of the original data that is trimmed to the first 3 years. If an array like object is passed in,
-            the data must be a 3D array with axis representing time, trials and assets respectively. In that
+            read-only view of the original data that is trimmed to the first 3 years. If an array like object is
+            passed in, the data must be a 3D array with axis representing time, trials and assets respectively. In that
             instance, the horizon will not be cut at 3 years, rather it'll be left to the user.
 
         rebalance: bool, optional
@@ -63,18 +71,22 @@ class AbstractPortfolioOptimizer(BaseOptimizer, ABC):
 
         kwargs:
             other keyword arguments to pass into :class:`OptData` (if you passed in a numpy array for `data`) or into
-            the :class:`BaseOptimizer`
+            the :class:`BaseOptimizer`. :code:`max_attempts` sets the number of restarts when the optimizer fails
+            and :code:`parallel_restarts` sets the number of restarts that are run concurrently. Defaults to 1,
+            which runs the restarts one after another. Set to -1 to use all available cores. As NLopt holds the GIL,
+            the restarts only overlap while the objective and constraints run NumPy code
 
         See Also
         --------
         :class:`BaseOptimizer`: Base Optimizer
         :class:`OptData`: Optimizer data wrapper
         """
+        time_unit = translate_frequency(time_unit)
         if not isinstance(data, OptData):
             data = OptData(data, time_unit)
 
         if cvar_data is None:
-            cvar_data = data.copy().cut_by_horizon(3)
+            cvar_data = data.cut_by_horizon(3)
         elif isinstance(cvar_data, (np.ndarray, list, tuple)):
             cvar_data = np.asarray(cvar_data)
             assert cvar_data.ndim == 3, "Must pass in a 3D array for cvar data"
@@ -88,13 +100,17 @@ class AbstractPortfolioOptimizer(BaseOptimizer, ABC):
         self.cvar_data: OptData = cvar_data
 
         self._rebalance = rebalance
-        self._max_attempts = kwargs.get('max_attempts', 100)
+        self._sum_to_1 = sum_to_1
+        self.max_attempts = kwargs.get('max_attempts', 100)
+
+        self.parallel_restarts = kwargs.get('parallel_restarts', 1)
 
         self._objectives = None
         self._constraints = None
+        self._sobol: Optional[qmc.Sobol] = None
 
         if sum_to_1:
-            self.add_equality_constraint(lambda w: sum(w) - 1)
+            self.add_equality_constraint(sum_equal_1)
 
     @property
     def max_attempts(self):
@@ -102,9 +118,21 @@ class AbstractPortfolioOptimizer(BaseOptimizer, ABC):
 
     @max_attempts.setter
     def max_attempts(self, value: int):
-        assert isinstance(value, int) and value > 0, 'max_attempts must be an integer >= 1'
+        if not isinstance(value, int) or value <= 0:
+            raise ValueError('max_attempts must be an integer >= 1')
         self._max_attempts = value
 
+    @property
+    def parallel_restarts(self):
+        """Number of restarts that are run concurrently"""
+        return self._parallel_restarts
+
+    @parallel_restarts.setter
+    def parallel_restarts(self, value: int):
+        if not isinstance(value, int) or not (value > 0 or value == -1):
+            raise ValueError('parallel_restarts must be an integer >= 1 or -1')
+        self._parallel_restarts = os.cpu_count() if value == -1 else value
+
     @property
     def rebalance(self):
         return self._rebalance
@@ -127,27 +155,156 @@ class AbstractPortfolioOptimizer(BaseOptimizer, ABC):
                  *args,
                  initial_solution: Optional[str] = "random",
                  random_state: Optional[int] = None) -> np.ndarray:
-        for _ in range(self.max_attempts):
+        # the sequence of restart points is restarted whenever a seed is given so that the draws are reproducible
+        if self._sobol is None or random_state is not None:
+            self._sobol = qmc.Sobol(self._n, scramble=True, seed=random_state)
+
+        self._last_x.fill(np.nan)
+        if self._parallel_restarts > 1:
+            return self._optimize_concurrently(x0, *args, initial_solution=initial_solution, random_state=random_state)
+
+        # noise used to perturb the failed run's last point, relative to the width of the bounds
+        sigma, warm_starts = 0.1, 0
+        for attempt in range(self.max_attempts):
             try:
+                # the random state only seeds the first attempt, the retries continue drawing from its stream
                 w = super().optimize(
                     x0,
                     *args,
                     initial_solution=initial_solution,
-                    random_state=random_state
+                    random_state=random_state if attempt == 0 else None
                 )
 
                 if w is not None and not np.isnan(w).any():
                     return w
 
             except (RoundoffLimited, RuntimeError):
-                if x0 == "random":
-                    x0 = np.random.uniform(self.lower_bounds, self.upper_bounds)
+                if np.isfinite(self._last_x).all() and warm_starts < 5:
+                    # the point reached by the failed run is usually closer to feasibility than a fresh sample. It
+                    # is perturbed with noise that shrinks on every retry so that the retry stays in the same basin
+                    # without failing at the same spot. Fresh restart points are only used after a few such retries
+                    x0 = self._perturb(self._last_x, sigma)
+                    sigma, warm_starts = sigma * 0.7, warm_starts + 1
+                elif isinstance(initial_solution, str) and initial_solution.lower() == "random":
+                    x0 = self._random_starts(1)[0]
                 else:
-                    initial_solution = "min_constraint_norm"
+                    # x0 takes precedence over the initial solution method, so it must be cleared for the
+                    # min_constraint_norm start to be used on the next attempt
+                    x0, initial_solution = None, "min_constraint_norm"
         else:
             if self._verbose:
                 print('No solution was found for the given problem. Check the summary() for more information')
-            return np.repeat(np.nan, self.data.n_assets)
+            return self._nan_buf.copy()
+
+    def _optimize_concurrently(self,
+                               x0: OptArray,
+                               *args,
+                               initial_solution: Optional[str],
+                               random_state: Optional[int]) -> np.ndarray:
+        """
+        Runs the restarts in batches, each restart on its own copy of the model. The first start is derived from the
+        given initial vector while the rest are spread over the bounds. The batches are as large as the number of
+        parallel restarts rounded up to a power of 2, which keeps the balance properties of the Sobol points.
+
+        The solution of the earliest successful attempt is returned, irrespective of which finishes first, so that
+        the result is reproducible for a given random state. Once it is accepted, the queued restarts of the batch
+        are dropped and the running ones stop at their next function evaluation. Note that NLopt's Python bindings do
+        not release the GIL, so the restarts only overlap while the objective and constraint functions are in NumPy
+        code which does
+        """
+        batch_size = 1 << (self._parallel_restarts - 1).bit_length()
+        start = self._starting_vector(x0, initial_solution, random_state)
+        self._reset_gradient_memos()
+
+        def solve(model: nl.opt, x: np.ndarray, cancelled: threading.Event):
+            if cancelled.is_set():
+                return None
+
+            _worker_state.model, _worker_state.error, _worker_state.cancelled = model, None, cancelled
+            try:
+                w = model.optimize(x, *args)
+                # a callback which raised or saw the cancellation stopped the copy without NLopt raising
+                return None if _worker_state.error is not None or cancelled.is_set() else w
+            except (ForcedStop, RoundoffLimited, RuntimeError):
+                return None
+            finally:
+                _worker_state.model = _worker_state.error = _worker_state.cancelled = None
+
+        with ThreadPoolExecutor(self._parallel_restarts) as executor:
+            for attempt in range(0, self.max_attempts, batch_size):
+                starts = self._random_starts(min(batch_size, self.max_attempts - attempt))
+                if attempt == 0:
+                    starts[0] = start
+
+                cancelled = threading.Event()
+                futures = [executor.submit(solve, nl.opt(self._model), x, cancelled) for x in starts]
+                try:
+                    # results are read in attempt order, thus the first valid one is also the earliest attempt
+                    for future in futures:
+                        w = future.result()
+                        if w is not None and not np.isnan(w).any():
+                            return self._set_solution(w)
+                finally:
+                    # drop the queued restarts of the batch and stop the running ones once a solution is accepted
+                    cancelled.set()
+                    for future in futures:
+                        future.cancel()
+
+        if self._verbose:
+            print('No solution was found for the given problem. Check the summary() for more information')
+        return self._nan_buf.copy()
+
+    def _perturb(self, x: np.ndarray, sigma: float) -> np.ndarray:
+        """Adds gaussian noise scaled to the width of the bounds, projecting long only weights back onto the simplex"""
+        lb, ub = self.lower_bounds, self.upper_bounds
+        x = x + self._rng.normal(0, sigma, self._n) * (ub - lb)
+        if self._sum_to_1 and (lb >= 0).all():
+            x = project_to_simplex(x)
+        return np.clip(x, lb, ub)
+
+    def _random_starts(self, n: int) -> np.ndarray:
+        """
+        Draws the next n points of a scrambled Sobol sequence scaled to the bounds. Unlike independent uniform
+        draws, successive points are spread evenly over the bound box so each restart explores a new region
+        """
+        lb, ub = self.lower_bounds, self.upper_bounds
+        assert np.isfinite(lb).all() and np.isfinite(ub).all(), "bounds must be finite to generate restart points"
+        return lb + (ub - lb) * self._sobol.random(n)
+
+    def add_max_cvar_constraints(self, max_cvars, percentiles=5.0, tol=None):
+        """
+        Adds CVaR constraints for several percentiles at once. The constraints are evaluated as a single vector
+        constraint with an analytic gradient, so the portfolio returns are computed once per evaluation instead of
+        once per percentile and once more for every asset to derive a numerical gradient.
+
+        Parameters
+        ----------
+        max_cvars: {scalar, iterable float}
+            The CVaR at each percentile must be greater than the corresponding value
+
+        percentiles: {scalar, iterable float}
+            The percentiles at which the CVaR are computed. Defaults to 5.0
+
+        tol
+            A tolerance in judging feasibility for the purposes of stopping the optimization
+
+        Returns
+        -------
+        AbstractPortfolioOptimizer
+            Own instance
+        """
+        max_cvars, percentiles = np.broadcast_arrays(np.asarray(max_cvars, np.float64),
+                                                     np.asarray(percentiles, np.float64))
+        max_cvars, percentiles = max_cvars.ravel().copy(), percentiles.ravel().copy()
+        assert np.all((0 <= percentiles) & (percentiles <= 100)), "Percentile must be a number between [0, 100]"
+
+        tol = self._c_eps if tol is None else tol
+        for limit, percentile in zip(max_cvars, percentiles):
+            self._cmap.add_inequality_constraint(self._constraints.max_cvar(limit, percentile))
+
+        self._model.add_inequality_mconstraint(self._constraints.max_cvars(max_cvars, percentiles),
+                                               np.full(len(max_cvars), tol, np.float64))
+        return self
 
     def add_equality_matrix_constraint(self, Aeq, beq, tol=None):
         s = get_option("C.SCALE")
@@ -183,8 +340,44 @@ class AbstractObjectiveBuilder(ABC):
             self._penalty = penalty
 
 
+def cached_objective(builder):
+    """
+    Property which builds the objective function once and returns the same function on every access. This is safe
+    as the objective functions only read the builder's data, penalty and rebalance settings when they are called
+    """
+    name = f"_{builder.__name__}_objective"
+
+    @wraps(builder)
+    def wrapper(self):
+        fn = self.__dict__.get(name)
+        if fn is None:
+            fn = self.__dict__[name] = builder(self)
+        return fn
+
+    return property(wrapper)
+
+
 class AbstractConstraintBuilder(ABC):
     def __init__(self, data: OptData, cvar_data: OptData, rebalance: bool):
         self.data = data
         self.cvar_data = cvar_data
         self.rebalance = rebalance
+
+    def max_cvars(self, max_cvars: np.ndarray, percentiles: np.ndarray):
+        """
+        CVaR at each percentile must be greater than its max_cvar. All percentiles are evaluated together as a single
+        vector constraint. The gradient is the average jacobian of the portfolio returns over the tail trials
+        """
+
+        def _ctr_max_cvars(result, w, grad):
+            s = get_option("C.SCALE")
+            returns = np.asarray(self.cvar_data.portfolio_returns(w, self.rebalance))
+            jac = self.cvar_data.portfolio_returns_jacobian(w, self.rebalance) if grad.size > 0 else None
+
+            for i, cutoff in enumerate(np.percentile(returns, percentiles)):
+                tail = returns <= cutoff
+                result[i] = s * (max_cvars[i] - returns[tail].mean())
+                if jac is not None:
+                    grad[i] = -s * jac[tail].mean(0)
+
+        return _ctr_max_cvars
@@ -6,30 +6,48 @@ class ConstraintBuilder(AbstractConstraintBuilder):
     def max_vol(self, max_vol: float, as_tracking_error=False):
         """Volatility must be less than max_vol"""
 
-        def _ctr_max_vol(w):
+        def _ctr_max_vol(w, grad=None):
             w = self._active_weights(w, as_tracking_error)
-            return get_option("C.SCALE") * (self.data.volatility(w) - max_vol)
+            s = get_option("C.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = s * self.data.volatility_gradient(w)
+                self._active_gradient(grad, as_tracking_error)
+            return s * (self.data.volatility(w) - max_vol)
 
         return _ctr_max_vol
 
     def max_cvar(self, max_cvar: float, percentile=5.0, as_active_cvar=False):
         """CVaR must be greater than max_cvar"""
 
-        def _ctr_max_cvar(w):
+        def _ctr_max_cvar(w, grad=None):
             w = self._active_weights(w, as_active_cvar)
-            return get_option("C.SCALE") * (max_cvar - self.cvar_data.cvar(w, self.rebalance, percentile))
+            s = get_option("C.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = -s * self.cvar_data.cvar_gradient(w, self.rebalance, percentile)
+                self._active_gradient(grad, as_active_cvar)
+            return s * (max_cvar - self.cvar_data.cvar(w, self.rebalance, percentile))
 
         return _ctr_max_cvar
 
     def min_returns(self, min_ret: float, as_active_returns=False):
         """Minimum returns constraint. This is used when objective is to minimize risk st to some minimum returns"""
 
-        def _ctr_min_returns(w):
+        def _ctr_min_returns(w, grad=None):
             w = self._active_weights(w, as_active_returns)
-            return get_option("C.SCALE") * (min_ret - self.data.expected_return(w, self.rebalance))
+            s = get_option("C.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = -s * self.data.expected_return_gradient(w, self.rebalance)
+                self._active_gradient(grad, as_active_returns)
+            return s * (min_ret - self.data.expected_return(w, self.rebalance))
 
         return _ctr_min_returns
 
     @staticmethod
     def _active_weights(w, active: bool):
         return [0, *w[1:]] if active else w
+
+    @staticmethod
+    def _active_gradient(grad, active: bool):
+        """The first weight is replaced by 0 for active measures, thus the constraint does not depend on it"""
+        if active:
+            grad[0] = 0
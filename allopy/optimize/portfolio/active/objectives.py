@@ -1,44 +1,68 @@
 from allopy import get_option
-from ..abstract import AbstractObjectiveBuilder
+from ..abstract import AbstractObjectiveBuilder, cached_objective
 
 
 class ObjectiveBuilder(AbstractObjectiveBuilder):
     def max_cvar(self, active_cvar: bool, percentile: float):
-        def objective(w):
+        def objective(w, grad=None):
             w = self._format_weights(w, active_cvar)
-            return (self.cvar_data.cvar(w, self.rebalance, percentile) - self.penalty(w)) * get_option("F.SCALE")
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.cvar_data.cvar_gradient(w, self.rebalance, percentile) - self.penalty.gradient(w)) * s
+                self._format_gradient(grad, active_cvar)
+            return (self.cvar_data.cvar(w, self.rebalance, percentile) - self.penalty(w)) * s
 
         return objective
 
-    @property
+    @cached_objective
     def max_returns(self):
-        def objective(w):
-            return (self.data.expected_return(w, self.rebalance) - self.penalty(w)) * get_option("F.SCALE")
+        def objective(w, grad=None):
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.expected_return_gradient(w, self.rebalance) - self.penalty.gradient(w)) * s
+            return (self.data.expected_return(w, self.rebalance) - self.penalty(w)) * s
 
         return objective
 
-    @property
+    @cached_objective
     def max_sharpe_ratio(self):
-        def objective(w):
-            return (self.data.sharpe_ratio(w, self.rebalance) - self.penalty(w)) * get_option("F.SCALE")
+        def objective(w, grad=None):
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.sharpe_ratio_gradient(w, self.rebalance) - self.penalty.gradient(w)) * s
+            return (self.data.sharpe_ratio(w, self.rebalance) - self.penalty(w)) * s
 
         return objective
 
-    @property
+    @cached_objective
     def max_info_ratio(self):
-        def objective(w):
+        def objective(w, grad=None):
             w = self._format_weights(w, True)
-            return (self.data.sharpe_ratio(w, self.rebalance) - self.penalty(w)) * get_option("F.SCALE")
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.sharpe_ratio_gradient(w, self.rebalance) - self.penalty.gradient(w)) * s
+                self._format_gradient(grad, True)
+            return (self.data.sharpe_ratio(w, self.rebalance) - self.penalty(w)) * s
 
         return objective
 
     def min_volatility(self, is_tracking_error: bool):
-        def objective(w):
+        def objective(w, grad=None):
             w = self._format_weights(w, remove_first_value=is_tracking_error)
-            return (self.data.volatility(w) + self.penalty(w)) * get_option("F.SCALE")
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.volatility_gradient(w) + self.penalty.gradient(w)) * s
+                self._format_gradient(grad, is_tracking_error)
+            return (self.data.volatility(w) + self.penalty(w)) * s
 
         return objective
 
     @staticmethod
     def _format_weights(w, remove_first_value: bool):
         return [0, *w[1:]] if remove_first_value else w
+
+    @staticmethod
+    def _format_gradient(grad, remove_first_value: bool):
+        """The first weight is replaced by 0 when it is removed, thus the objective does not depend on it"""
+        if remove_first_value:
+            grad[0] = 0
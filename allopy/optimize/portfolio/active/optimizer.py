@@ -49,8 +49,8 @@ class ActivePortfolioOptimizer(AbstractPortfolioOptimizer):
 
         cvar_data: {ndarray, OptData}
             The cvar_data data used as constraint during the optimization. If this is not set, will default to being a
-            copy of the original data that is trimmed to the first 3 years. If an array like object is passed in,
-            the data must be a 3D array with axis representing time, trials and assets respectively. In that
+            read-only view of the original data that is trimmed to the first 3 years. If an array like object is
+            passed in, the data must be a 3D array with axis representing time, trials and assets respectively. In that
             instance, the horizon will not be cut at 3 years, rather it'll be left to the user.
 
         rebalance: bool, optional
@@ -7,23 +7,32 @@ class ConstraintBuilder(AbstractConstraintBuilder):
     def max_vol(self, max_vol: float):
         """Volatility must be less than max_vol"""
 
-        def _ctr_max_vol(w):
-            return get_option("C.SCALE") * (self.data.volatility(w) - max_vol)
+        def _ctr_max_vol(w, grad=None):
+            s = get_option("C.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = s * self.data.volatility_gradient(w)
+            return s * (self.data.volatility(w) - max_vol)
 
         return _ctr_max_vol
 
     def max_cvar(self, max_cvar: float, percentile=5.0):
         """CVaR must be greater than max_cvar"""
 
-        def _ctr_max_cvar(w):
-            return get_option("C.SCALE") * (max_cvar - self.cvar_data.cvar(w, self.rebalance, percentile))
+        def _ctr_max_cvar(w, grad=None):
+            s = get_option("C.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = -s * self.cvar_data.cvar_gradient(w, self.rebalance, percentile)
+            return s * (max_cvar - self.cvar_data.cvar(w, self.rebalance, percentile))
 
         return _ctr_max_cvar
 
     def min_returns(self, min_ret: float):
         """Minimum returns constraint. This is used when objective is to minimize risk st to some minimum returns"""
 
-        def _ctr_min_returns(w):
-            return get_option("C.SCALE") * (min_ret - self.data.expected_return(w, self.rebalance))
+        def _ctr_min_returns(w, grad=None):
+            s = get_option("C.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = -s * self.data.expected_return_gradient(w, self.rebalance)
+            return s * (min_ret - self.data.expected_return(w, self.rebalance))
 
         return _ctr_min_returns
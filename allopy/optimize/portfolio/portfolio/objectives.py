@@ -1,35 +1,47 @@
 from allopy import get_option
-from ..abstract import AbstractObjectiveBuilder
+from ..abstract import AbstractObjectiveBuilder, cached_objective
 
 
 class ObjectiveBuilder(AbstractObjectiveBuilder):
     def max_cvar(self, percentile: float):
         """Maximizes the CVaR. This means that we're minimizing the losses"""
 
-        def objective(w):
-            return (self.cvar_data.cvar(w, self.rebalance, percentile) - self.penalty(w)) * get_option("F.SCALE")
+        def objective(w, grad=None):
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.cvar_data.cvar_gradient(w, self.rebalance, percentile) - self.penalty.gradient(w)) * s
+            return (self.cvar_data.cvar(w, self.rebalance, percentile) - self.penalty(w)) * s
 
         return objective
 
-    @property
+    @cached_objective
     def max_returns(self):
         """Objective function to maximize the returns"""
 
-        def objective(w):
-            return (self.data.expected_return(w, self.rebalance) - self.penalty(w)) * get_option("F.SCALE")
+        def objective(w, grad=None):
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.expected_return_gradient(w, self.rebalance) - self.penalty.gradient(w)) * s
+            return (self.data.expected_return(w, self.rebalance) - self.penalty(w)) * s
 
         return objective
 
-    @property
+    @cached_objective
     def max_sharpe_ratio(self):
-        def objective(w):
-            return (self.data.sharpe_ratio(w, self.rebalance) - self.penalty(w)) * get_option("F.SCALE")
+        def objective(w, grad=None):
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.sharpe_ratio_gradient(w, self.rebalance) - self.penalty.gradient(w)) * s
+            return (self.data.sharpe_ratio(w, self.rebalance) - self.penalty(w)) * s
 
         return objective
 
-    @property
+    @cached_objective
     def min_vol(self):
-        def objective(w):
-            return (self.data.volatility(w) + self.penalty(w)) * get_option("F.SCALE")
+        def objective(w, grad=None):
+            s = get_option("F.SCALE")
+            if grad is not None and grad.size > 0:
+                grad[:] = (self.data.volatility_gradient(w) + self.penalty.gradient(w)) * s
+            return (self.data.volatility(w) + self.penalty(w)) * s
 
         return objective
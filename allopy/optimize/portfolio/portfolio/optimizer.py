@@ -3,6 +3,7 @@ from typing import Optional, Union
 import numpy as np
 
 from allopy import OptData
+from allopy.penalty import NoPenalty
 from allopy.optimize.algorithms import LD_SLSQP
 from allopy.types import OptArray, OptReal
 from .constraints import ConstraintBuilder
@@ -37,8 +38,8 @@ class PortfolioOptimizer(AbstractPortfolioOptimizer):
 
         cvar_data: {ndarray, OptData}
             The cvar_data data used as constraint during the optimization. If this is not set, will default to being a
-            copy of the original data that is trimmed to the first 3 years. If an array like object is passed in,
-            the data must be a 3D array with axis representing time, trials and assets respectively. In that
+            read-only view of the original data that is trimmed to the first 3 years. If an array like object is
+            passed in, the data must be a 3D array with axis representing time, trials and assets respectively. In that
             instance, the horizon will not be cut at 3 years, rather it'll be left to the user.
 
         rebalance: bool, optional
@@ -168,6 +169,11 @@ class PortfolioOptimizer(AbstractPortfolioOptimizer):
             self.add_inequality_constraint(self._constraints.min_returns(min_ret), tol)
 
         self.set_min_objective(self._objectives.min_vol)
+
+        w = self._min_variance_portfolio()
+        if w is not None:
+            return w
+
         return self.optimize(x0, initial_solution=initial_solution, random_state=random_state)
 
     def minimize_cvar(self,
@@ -253,3 +259,30 @@ class PortfolioOptimizer(AbstractPortfolioOptimizer):
         """
         self.set_max_objective(self._objectives.max_sharpe_ratio)
         return self.optimize(x0, initial_solution=initial_solution, random_state=random_state)
+
+    def _min_variance_portfolio(self) -> Optional[np.ndarray]:
+        r"""
+        Closed form solution of the minimum variance portfolio, :math:`\Sigma^{-1} \mathbf{1}` normalized to sum to 1.
+
+        This only applies when the weights must sum to 1 and there are no other constraints or penalty. Returns None
+        if that is not the case, if the covariance matrix is singular or if the solution breaks the bounds, in which
+        case the problem has to be solved numerically
+        """
+        cmap = self._cmap
+        if not self._sum_to_1 or len(cmap.equality) != 1 or len(cmap.inequality) > 0 \
+                or not isinstance(self.penalty, NoPenalty):
+            return None
+
+        try:
+            x = np.linalg.solve(self.data.cov_mat, np.ones(self._n))
+        except np.linalg.LinAlgError:
+            return None
+
+        if not np.isfinite(x).all() or x.sum() <= 0:
+            return None
+
+        w = x / x.sum()
+        if (w < self.lower_bounds).any() or (w > self.upper_bounds).any():
+            return None
+
+        return self._set_solution(w)
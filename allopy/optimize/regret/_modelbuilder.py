@@ -1,11 +1,12 @@
-from typing import List, Union
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import nlopt as nl
 import numpy as np
 
 from allopy.optimize import BaseOptimizer
-from allopy.optimize.algorithms import has_gradient, map_algorithm
-from allopy.optimize.utils import create_matrix_constraint, validate_matrix_constraints
+from allopy.optimize.algorithms import GradientSupport, has_gradient, map_algorithm
+from allopy.optimize.utils import sum_equal_1, validate_matrix_constraints
 from .constraint import ConstraintMap
 from .types import Arg1Func, Arg2Func
 
@@ -29,7 +30,7 @@ class ModelBuilder:
                  c_eps: float,
                  verbose: bool):
         algorithm = map_algorithm(algorithm) if isinstance(algorithm, str) else algorithm
-        if has_gradient(algorithm) == 'NOT COMPILED':
+        if has_gradient(algorithm) is GradientSupport.NOT_COMPILED:
             raise NotImplementedError(
                 f"Cannot use '{nl.algorithm_name(algorithm)}' as it is not compiled")
 
@@ -37,9 +38,11 @@ class ModelBuilder:
         self.num_assets = num_assets
         self.algorithm = algorithm
         self.max_or_min = None
+        self._models: Dict[int, BaseOptimizer] = {}
+        self._grad_funcs: Dict[Tuple[Callable, float, str, int, Optional[Executor]], Callable] = {}
         self._obj_funcs: ObjectiveFunc = []
-        self.lower_bounds = np.repeat(0, num_assets)
-        self.upper_bounds = np.repeat(1, num_assets)
+        self.lower_bounds = _read_only(np.zeros(num_assets))
+        self.upper_bounds = _read_only(np.ones(num_assets))
         self.constraints = ConstraintMap(num_scenarios)
 
         self.x_tol_abs = x_tol_abs
@@ -51,9 +54,25 @@ class ModelBuilder:
         self.verbose = verbose
         self.sum_to_1 = sum_to_1
 
+    def invalidate(self):
+        """
+        Drops the built scenario models and their gradient wrappers. The models are built once and reused, so this
+        must be called whenever a setting they are built from changes
+        """
+        self._models = {}
+        self._grad_funcs = {}
+
     def __call__(self, index: int):
-        """Creates the individual optimization model for the first step"""
+        """Returns the individual optimization model for the first step. Models are built once per scenario"""
+        if index not in self._models:
+            self._models[index] = self._build(index)
+        return self._models[index]
+
+    def _build(self, index: int):
         model = BaseOptimizer(self.num_assets, self.algorithm, verbose=self.verbose)
+        # the scenario models are configured identically, thus a function which is given for every scenario (i.e. a
+        # single function for all) only needs its numerical gradient wrapper built once
+        model._grad_funcs = self._grad_funcs
         model.set_bounds(self.lower_bounds, self.upper_bounds)
 
         # sets up optimizer's programs and bounds
@@ -68,24 +87,27 @@ class ModelBuilder:
                 set_option(item)
 
         # constraint functions are applied to each model (based on index)
-        # matrix constraints have been transformed to functions in RegretOptimizer,
-        # thus we use add_(in)equality_constraint constraint directly
         for constraints, set_constraint in [
             (self.constraints.equality, model.add_equality_constraint),
             (self.constraints.inequality, model.add_inequality_constraint),
-            (self.constraints.m_equality, model.add_equality_constraint),
-            (self.constraints.m_inequality, model.add_inequality_constraint)
         ]:
             for fn_list in constraints.values():
                 set_constraint(fn_list[index], self.c_eps)
 
+        # matrix constraints are the same for every scenario. All the rows of a kind are evaluated by one vector-valued
+        # constraint, built from the stacked matrices
+        for equality, set_constraint in [
+            (True, model.add_equality_matrix_constraint),
+            (False, model.add_inequality_matrix_constraint),
+        ]:
+            stacked = self.constraints.stacked_matrix(equality)
+            if stacked is not None:
+                set_constraint(*stacked, self.c_eps)
+
         if self.sum_to_1:
-            model.add_equality_constraint(lambda x: sum(x) - 1)
+            model.add_equality_constraint(sum_equal_1)
 
         # sets up the objective function
-        assert self.max_or_min in ('maximize', 'minimize') and len(self._obj_funcs) == self.num_scenarios, \
-            "Objective function is not set yet. Use the .set_max_objective() or .set_min_objective() methods to do so"
-
         if self.max_or_min == "maximize":
             model.set_max_objective(self._obj_funcs[index])
         else:
@@ -93,6 +115,39 @@ class ModelBuilder:
 
         return model
 
+    def solve_all(self,
+                  solve: Callable[[int, BaseOptimizer, Optional[np.ndarray]], np.ndarray],
+                  x0: Sequence[Optional[np.ndarray]],
+                  n_jobs: int = 1) -> np.ndarray:
+        """
+        Solves the first step model of every scenario with :code:`solve(index, model, x0)`. The solutions are written
+        into a single contiguous matrix where each row represents a scenario and each column represents an asset class.
+        If :code:`n_jobs` is more than 1, the scenarios are solved concurrently
+        """
+        # checked once for the whole sweep instead of for every scenario model
+        if self.max_or_min not in ('maximize', 'minimize') or len(self._obj_funcs) != self.num_scenarios:
+            raise ValueError("Objective function is not set yet. Use the .set_max_objective() or .set_min_objective() "
+                             "methods to do so")
+
+        # the models are built upfront so that the workers only read the model cache
+        models = [self(i) for i in range(self.num_scenarios)]
+        solutions = np.empty((self.num_scenarios, self.num_assets), np.float64)
+
+        def run(i: int):
+            solutions[i] = solve(i, models[i], x0[i])
+
+        n_jobs = min(n_jobs, self.num_scenarios)
+        if n_jobs > 1:
+            # every scenario has its own model and data, so the problems share no state and can run in threads
+            with ThreadPoolExecutor(n_jobs) as executor:
+                for _ in executor.map(run, range(self.num_scenarios)):
+                    pass
+        else:
+            for i in range(self.num_scenarios):
+                run(i)
+
+        return solutions
+
     @property
     def obj_funcs(self):
         return self._obj_funcs
@@ -101,30 +156,36 @@ class ModelBuilder:
     def obj_funcs(self, functions: ObjectiveFunc):
         self._validate_num_functions(functions)
         self._obj_funcs = functions
+        self._models.clear()
 
     def add_inequality_constraints(self, functions: ConstraintFunc):
         self._validate_num_functions(functions)
+        self._models.clear()
         self.constraints.add_inequality_constraints(functions)
 
     def add_equality_constraints(self, functions: ConstraintFunc):
         self._validate_num_functions(functions)
+        self._models.clear()
         self.constraints.add_equality_constraints(functions)
 
     def add_inequality_matrix_constraints(self, A, b):
         A, b = validate_matrix_constraints(A, b)
-
-        for i, row, limit in zip(range(len(b)), A, b):
-            fn = create_matrix_constraint(row, limit, f"A_{i}")
-            self.constraints.add_matrix_inequality_constraints([fn] * self.num_scenarios)
+        self.constraints.add_inequality_matrix(A, b)
+        self._models.clear()
 
     def add_equality_matrix_constraints(self, Aeq, beq):
         Aeq, beq = validate_matrix_constraints(Aeq, beq)
-
-        for i, row, limit in zip(range(len(beq)), Aeq, beq):
-            fn = create_matrix_constraint(row, limit, f"AEQ_{i}")
-            self.constraints.add_matrix_equality_constraints([fn] * self.num_scenarios)
+        self.constraints.add_equality_matrix(Aeq, beq)
+        self._models.clear()
 
     def _validate_num_functions(self, funcs: List):
         error_msg = f"Number of functions do not match. Functions given: {len(funcs)}. " \
                     f"Functions expected: {self.num_scenarios}"
-        assert len(funcs) == self.num_scenarios, error_msg
+        if len(funcs) != self.num_scenarios:
+            raise ValueError(error_msg)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """Marks the array read only so that it cannot be changed in place behind the back of the built models"""
+    array.setflags(write=False)
+    return array
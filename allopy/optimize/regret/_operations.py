@@ -1,22 +1,27 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
 from typing import Callable, List, Optional, Union
 
-import nlopt as nl
 import numpy as np
+from nlopt import RoundoffLimited
 
 from allopy.optimize.base import BaseOptimizer
+from allopy.optimize.utils import _count_parameters, _evaluate, project_to_simplex, sum_equal_1
 from allopy.types import OptArray
 from ._modelbuilder import ModelBuilder
 from .result import RegretOptimizerSolution, RegretResult
 
 
 class OptimizationOperation:
-    def __init__(self, builder: ModelBuilder, prob: np.ndarray, max_attempts: int, verbose: bool):
+    def __init__(self, builder: ModelBuilder, prob: np.ndarray, max_attempts: int, verbose: bool, n_jobs: int = 1):
         self.builder = builder
         self.prob = prob
         self.solution: Optional[RegretOptimizerSolution] = None
         self.result: Optional[RegretResult] = None
         self.max_attempts = max_attempts
         self.verbose = verbose
+        self.n_jobs = n_jobs
+        # evaluates the scenario objectives of the second stage concurrently, only set while optimizing
+        self._executor: Optional[Executor] = None
 
     def optimize(self,
                  x0_first_level: Optional[Union[List[OptArray], np.ndarray]] = None,
@@ -25,9 +30,6 @@ class OptimizationOperation:
                  approx=True,
                  dist_func: Union[Callable[[np.ndarray], np.ndarray], np.ufunc] = np.square,
                  random_state: Optional[int] = None):
-        if isinstance(random_state, int) and isinstance(initial_solution, str) and initial_solution.lower() == "random":
-            np.random.seed(random_state)
-
         self._validate_dist_func(dist_func)
         x0_first_level = self._validate_first_level_solution(x0_first_level)
         mb = self.builder
@@ -35,30 +37,65 @@ class OptimizationOperation:
 
         # optimal solution to each scenario. Each row represents a single scenario and
         # each column represents an asset class
-        solutions = np.array([
-            self._optimize(mb(i), x0_first_level[i], initial_solution)
-            for i in range(num_scenarios)
-        ])
-
-        if np.isnan(solutions).any():
-            props = np.repeat(np.nan, num_scenarios) if approx else None
-            weights = np.repeat(np.nan, num_assets)
-        elif approx:
-            props, weights = self._optimize_approx(x0_prop, solutions, dist_func, initial_solution)
-        else:
-            props, weights = self._optimize_actual(x0_prop, solutions, dist_func, initial_solution)
+        # every scenario draws its random starting points from its own stream, derived from the random state
+        # so that the draws do not depend on the order in which the scenarios are solved
+        seeds = np.random.SeedSequence(random_state).spawn(num_scenarios) if random_state is not None else None
+
+        # when the scenarios are solved one after another, a scenario without an initial vector starts from the last
+        # scenario solution if that is feasible for it. Scenarios tend to share most of their constraints, so this
+        # is usually a better start than the initial solution heuristic. The order is fixed, thus this stays
+        # reproducible with random initial solutions
+        warm_start = self.n_jobs == 1
+        last_solution: List[np.ndarray] = []
+
+        def solve(index: int, model: BaseOptimizer, x0: OptArray):
+            if x0 is None and warm_start and last_solution and _is_feasible(model, last_solution[0], mb.c_eps):
+                # copied as the model may clip the initial vector to its bounds in place
+                x0 = last_solution[0].copy()
+
+            w = self._optimize(model, x0, initial_solution, None if seeds is None else seeds[index], mb.sum_to_1)
+            if warm_start and not np.isnan(w).any():
+                last_solution[:] = [w]
+            return w
+
+        solutions = mb.solve_all(solve, x0_first_level, self.n_jobs)
+
+        n_jobs = min(self.n_jobs, num_scenarios)
+        self._executor = ThreadPoolExecutor(n_jobs) if n_jobs > 1 else None
+        try:
+            if np.isnan(solutions).any():
+                props = np.full(num_scenarios, np.nan) if approx else None
+                weights = np.full(num_assets, np.nan)
+            elif approx:
+                props, weights = self._optimize_approx(x0_prop, solutions, dist_func, initial_solution)
+            else:
+                props, weights = self._optimize_actual(x0_prop, solutions, dist_func, initial_solution)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
 
         self.solution = RegretOptimizerSolution(weights, solutions, props)
         self.result = RegretResult(self.builder, weights, solutions, props, dist_func, self.prob, mb.c_eps)
 
         return self
 
-    def _optimize(self, model: BaseOptimizer, x0: OptArray = None, initial_solution=None):
-        """Helper method to run the model"""
+    def _optimize(self, model: BaseOptimizer, x0: OptArray = None, initial_solution=None, random_state=None,
+                  sum_to_1=False):
+        """
+        Helper method to run the model. The random state only seeds the first attempt, retries continue its stream.
+        A run which failed midway is retried from a perturbation of the last point it reached, which is usually
+        closer to the optimum than a fresh start. Fresh starts are only used after a few such retries
+        """
+        # noise used to perturb the failed run's last point, relative to the width of the bounds
+        sigma, warm_starts = 0.1, 0
+        last_x = model._last_x
+        last_x.fill(np.nan)
 
-        for _ in range(self.max_attempts):
+        for attempt in range(self.max_attempts):
             try:
-                w = model.optimize(x0, initial_solution=initial_solution)
+                w = model.optimize(x0, initial_solution=initial_solution,
+                                   random_state=random_state if attempt == 0 else None)
                 if w is None or np.isnan(w).any():
                     if initial_solution is None:
                         initial_solution = "random"
@@ -66,14 +103,19 @@ class OptimizationOperation:
                 else:
                     return w
 
-            except (nl.RoundoffLimited, RuntimeError):
-                if initial_solution is None:
-                    initial_solution = "random"
-                x0 = None
+            except (RoundoffLimited, RuntimeError):
+                if np.isfinite(last_x).all() and warm_starts < 5:
+                    x0 = _perturb(model, last_x, sigma, sum_to_1)
+                    sigma, warm_starts = sigma * 0.7, warm_starts + 1
+                else:
+                    if initial_solution is None:
+                        initial_solution = "random"
+                    x0 = None
         else:
             if self.verbose:
                 print('No solution was found for the given problem. Check the summary() for more information')
-            return np.repeat(np.nan, self.builder.num_assets)
+            # sized to the model as the proportions of the second stage have one element per scenario
+            return model._nan_buf.copy()
 
     def _optimize_actual(self,
                          x0: OptArray,
@@ -100,20 +142,39 @@ class OptimizationOperation:
             :code:`None` to disable. However, if disabled, the initial vector must be supplied.
         """
         builder = self.builder
-        f_values = np.array(f(s) for f, s in zip(builder.obj_funcs, solutions))
+        # the regret is scaled by 100, which is folded into the probabilities once instead of on every evaluation
+        scaled_prob = 100 * np.ascontiguousarray(self.prob, dtype=np.float64)
+        funcs = tuple(builder.obj_funcs)
+        executor = self._executor
+
+        f_values = np.empty(builder.num_scenarios, np.float64)
+        for i, (f, s) in enumerate(zip(funcs, solutions)):
+            f_values[i] = f(s)
+
+        if _has_square_regret_gradient(funcs, dist_func):
+            regret = _square_regret(funcs, f_values, scaled_prob, builder.num_assets, executor)
+        else:
+            # buffer for the objective values at the current weights, reused on every evaluation
+            curr_f_values = np.empty_like(f_values)
+            distance = _inplace_distance(dist_func)
 
-        def regret(w):
-            curr_f_values = np.array([f(w) for f in builder.obj_funcs])
-            cost = dist_func(f_values - curr_f_values)
-            return 100 * sum(self.prob * cost)
+            def regret(w):
+                _evaluate_scenarios(curr_f_values, lambda i: funcs[i](w), executor)
+                cost = distance(f_values - curr_f_values)
+                return float(scaled_prob @ cost)
 
         model = BaseOptimizer(builder.num_assets)
         model.set_min_objective(regret)
         model.set_bounds(builder.lower_bounds, builder.upper_bounds)
+        if builder.sum_to_1:
+            # the decision variables are the final weights here, so they must be kept on the simplex explicitly.
+            # The approximate step does not need this as any blend of the scenario solutions already sums to 1
+            model.add_equality_constraint(sum_equal_1)
 
         return None, self._optimize(model,
                                     self.prob @ solutions if x0 is None else x0,
-                                    initial_solution)
+                                    initial_solution,
+                                    sum_to_1=builder.sum_to_1)
 
     def _optimize_approx(self,
                          x0: OptArray,
@@ -143,26 +204,71 @@ class OptimizationOperation:
         """
         # weighted function values for each scenario
         builder = self.builder
+        # the regret is scaled by 100, which is folded into the probabilities once instead of on every evaluation
+        scaled_prob = 100 * np.ascontiguousarray(self.prob, dtype=np.float64)
         f_values = np.array([f(s) for f, s in zip(builder.obj_funcs, solutions)])
+        coefficients = _affine_coefficients(builder.obj_funcs, solutions, f_values)
+        distance = _inplace_distance(dist_func)
+
+        if coefficients is not None:
+            # all objectives are affine, f(w) = a @ w + b, so the objective values of the blended portfolio are
+            # a matrix product of the proportions. The scenario solutions are folded into the coefficients
+            A, b = coefficients
+            M = A @ solutions.T
+            MT = np.ascontiguousarray(M.T)
+
+            if dist_func is np.square:
+                # the regret is then a quadratic in the proportions and its gradient is known in closed form
+                def regret(p, grad=None):
+                    diff = f_values - (M @ p + b)
+                    weighted = scaled_prob * diff
+                    if grad is not None and grad.size > 0:
+                        grad[:] = -2 * (MT @ weighted)
+                    return float(weighted @ diff)
+            else:
+                def regret(p):
+                    cost = distance(f_values - (M @ p + b))
+                    return float(scaled_prob @ cost)
+        elif _has_square_regret_gradient(builder.obj_funcs, dist_func):
+            # chain rule through the blended weights, w = p @ W, thus the gradient is W @ (gradient in w)
+            regret_w = _square_regret(tuple(builder.obj_funcs), f_values, scaled_prob, builder.num_assets,
+                                      self._executor)
+            grad_w = np.empty(builder.num_assets)
+
+            def regret(p, grad=None):
+                if grad is None or grad.size == 0:
+                    return regret_w(p @ solutions)
+
+                value = regret_w(p @ solutions, grad_w)
+                grad[:] = solutions @ grad_w
+                return value
+        else:
+            funcs = tuple(builder.obj_funcs)
+            executor = self._executor
+            # buffer for the objective values of the blended portfolio, reused on every evaluation
+            curr_f_values = np.empty_like(f_values)
 
-        def regret(p):
-            cost = f_values - np.array([f(p @ solutions) for f in builder.obj_funcs])
-            cost = dist_func(cost)
-            return 100 * sum(self.prob * cost)
+            def regret(p):
+                w = p @ solutions
+                _evaluate_scenarios(curr_f_values, lambda i: funcs[i](w), executor)
+                cost = distance(f_values - curr_f_values)
+                return float(scaled_prob @ cost)
 
         model = BaseOptimizer(builder.num_scenarios)
         model.set_min_objective(regret)
         model.set_bounds(0, 1)
-        model.add_equality_constraint(lambda p: sum(p) - 1)
+        model.add_equality_constraint(sum_equal_1)
         proportions = self._optimize(model,
                                      self.prob if x0 is None else x0,
-                                     initial_solution)
+                                     initial_solution,
+                                     sum_to_1=True)
         return proportions, proportions @ solutions
 
     def _validate_dist_func(self, dist_func):
         assert callable(dist_func), "dist_func must be a callable function"
 
-        assert isinstance(dist_func(np.random.uniform(size=self.builder.num_assets)), np.ndarray), \
+        # any vector will do for the check. A fixed one leaves the global random state alone
+        assert isinstance(dist_func(np.linspace(0, 1, self.builder.num_assets)), np.ndarray), \
             "dist_func must map a vector to a vector"
 
     def _validate_first_level_solution(self, x0_first_level: Optional[Union[List[OptArray], np.ndarray]]):
@@ -173,3 +279,103 @@ class OptimizationOperation:
             "Initial first level solution data must match number of scenarios"
 
         return x0_first_level
+
+
+def _has_square_regret_gradient(funcs, dist_func) -> bool:
+    """The regret gradient is known when the distance is the default square and every objective gives its gradient"""
+    return dist_func is np.square and all(_count_parameters(f) == 2 for f in funcs)
+
+
+def _square_regret(funcs, f_values: np.ndarray, scaled_prob: np.ndarray, num_assets: int,
+                   executor: Optional[Executor] = None):
+    r"""
+    Creates the square distance regret of the weights, :math:`\sum_s p_s (f_s(w_s) - f_s(w))^2`, with its analytic
+    gradient :math:`-2 \sum_s p_s (f_s(w_s) - f_s(w)) \nabla f_s(w)` derived from the objectives' own gradients
+    """
+    curr_f_values = np.empty_like(f_values)
+    # each objective is always given its row, user objectives may write their gradient without checking its size
+    jacobian = np.empty((len(funcs), num_assets))
+
+    def regret(w, grad=None):
+        with_grad = grad is not None and grad.size > 0
+        _evaluate_scenarios(curr_f_values, lambda i: funcs[i](w, jacobian[i]), executor)
+
+        weighted = scaled_prob * (f_values - curr_f_values)
+        if with_grad:
+            grad[:] = -2 * (weighted @ jacobian)
+        return float(weighted @ (f_values - curr_f_values))
+
+    return regret
+
+
+def _evaluate_scenarios(out: np.ndarray, value: Callable[[int], float], executor: Optional[Executor] = None):
+    """
+    Fills :code:`out` with the value of every scenario. The scenarios' objectives are independent NumPy contractions
+    over their own data which release the GIL, thus they are evaluated concurrently if an executor is given
+    """
+    if executor is None:
+        for i in range(len(out)):
+            out[i] = value(i)
+    else:
+        out[:] = np.fromiter(executor.map(value, range(len(out))), np.float64, len(out))
+
+
+def _inplace_distance(dist_func: Union[Callable[[np.ndarray], np.ndarray], np.ufunc]):
+    """
+    Unary ufuncs such as the default :code:`np.square` are applied in place on the (temporary) array of differences
+    to save an allocation on every regret evaluation. Other callables are used as they are
+    """
+    if isinstance(dist_func, np.ufunc) and dist_func.nin == 1 and dist_func.nout == 1:
+        return lambda x: dist_func(x, out=x)
+    return dist_func
+
+
+def _is_feasible(model: BaseOptimizer, w: np.ndarray, eps: float) -> bool:
+    """Checks if the weights lie within the bounds and satisfy all the constraints of the model"""
+    if np.any(w < model.lower_bounds - eps) or np.any(w > model.upper_bounds + eps):
+        return False
+
+    cmap = model._cmap
+    return all(_evaluate(f, w) <= eps for f in cmap.inequality.values()) and \
+           all(abs(_evaluate(f, w)) <= eps for f in cmap.equality.values())
+
+
+def _perturb(model: BaseOptimizer, x: np.ndarray, sigma: float, sum_to_1: bool) -> np.ndarray:
+    """Adds gaussian noise scaled to the width of the bounds, projecting long only weights back onto the simplex"""
+    lb, ub = model.lower_bounds, model.upper_bounds
+    x = x + model._rng.normal(0, sigma, len(x)) * (ub - lb)
+    if sum_to_1 and (lb >= 0).all():
+        x = project_to_simplex(x)
+    return np.clip(x, lb, ub)
+
+
+def _affine_coefficients(funcs, solutions: np.ndarray, f_values: np.ndarray, step=1e-3):
+    """
+    Probes whether every objective function is affine. If so, returns the coefficient matrix :code:`A` and the
+    intercepts :code:`b` such that the function values at :code:`w` are :code:`A @ w + b`. Otherwise returns None.
+
+    The coefficients are derived with forward differences around the center of the scenario solutions. Every
+    objective is then verified at every scenario solution and at an interior point of their hull, so that piecewise
+    linear objectives (e.g. CVaR without rebalancing) whose kinks lie between the solutions fall back to the generic
+    path
+    """
+    num_scenarios, n = solutions.shape
+    center = solutions.mean(0)
+    points = center + step * np.vstack([np.zeros(n), np.eye(n)])
+    # an uneven blend of the solutions, so that it differs from the center the coefficients are derived at
+    blend = np.arange(1, num_scenarios + 1) / (num_scenarios * (num_scenarios + 1) / 2)
+    checks = np.vstack([solutions, blend @ solutions])
+
+    A = np.empty((num_scenarios, n))
+    b = np.empty(num_scenarios)
+    for i, f in enumerate(funcs):
+        values = np.array([f(x) for x in points], dtype=float)
+        A[i] = (values[1:] - values[0]) / step
+        b[i] = values[0] - A[i] @ center
+
+        # the value at the scenario's own solution is already known
+        actual = np.array([f_values[i] if j == i else f(x) for j, x in enumerate(checks)], dtype=float)
+        if not np.isfinite(actual).all() or not np.allclose(checks @ A[i] + b[i], actual, rtol=1e-8, atol=1e-12):
+            return None
+
+    return A, b
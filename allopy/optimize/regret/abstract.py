@@ -13,16 +13,16 @@ class AbstractObjectiveBuilder(ABC):
     def __init__(self, data: List[OptData], cvar_data: List[OptData], rebalance: bool, time_unit):
         self.data, self.cvar_data = format_inputs(data, cvar_data, time_unit)
         self.rebalance = rebalance
-        self.num_scenarios = len(data)
+        self.num_scenarios = len(self.data)
 
         assert self.num_scenarios > 0, "Provide data to the optimizer"
-        assert self.num_scenarios == len(cvar_data), "data and cvar data must have same number of scenarios"
+        assert self.num_scenarios == len(self.cvar_data), "data and cvar data must have same number of scenarios"
 
-        self.num_assets = data[0].n_assets
-        assert all(d.n_assets == self.num_assets for d in data), \
+        self.num_assets = self.data[0].n_assets
+        assert all(d.n_assets == self.num_assets for d in self.data), \
             f"number of assets in data should equal {self.num_assets}"
 
-        assert all(d.n_assets == self.num_assets for d in cvar_data), \
+        assert all(d.n_assets == self.num_assets for d in self.cvar_data), \
             f"number of assets in cvar data should equal {self.num_assets}"
 
         self._penalties = [NoPenalty(self.num_assets)] * self.num_scenarios
@@ -57,10 +57,10 @@ class AbstractConstraintBuilder(ABC):
 def format_inputs(data: List[Union[OptData, np.ndarray]],
                   cvar_data: Optional[List[Union[OptData, np.ndarray]]],
                   time_unit: int):
-    data = [d if isinstance(data, OptData) else OptData(d, time_unit) for d in data]
+    data = [d if isinstance(d, OptData) else OptData(d, time_unit) for d in data]
 
     if cvar_data is None:
-        return [d.cut_by_horizon(3) for d in data]
+        cvar_data = [d.cut_by_horizon(3) for d in data]
     else:
         cvar_data = [c if isinstance(c, OptData) else OptData(c, time_unit) for c in cvar_data]
 
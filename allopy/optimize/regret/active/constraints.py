@@ -10,9 +10,13 @@ class ConstraintBuilder(AbstractConstraintBuilder):
         max_vol = self._format_constraint(max_vol, "Max volatility")
 
         def constraint_creator(d: OptData, vol: float):
-            def constraint(w):
+            def constraint(w, grad=None):
                 w = format_weights(w, as_tracking_error)
-                return get_option("C.SCALE") * (d.volatility(w) - vol)
+                s = get_option("C.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = s * d.volatility_gradient(w)
+                    format_gradient(grad, as_tracking_error)
+                return s * (d.volatility(w) - vol)
 
             return constraint
 
@@ -23,9 +27,13 @@ class ConstraintBuilder(AbstractConstraintBuilder):
         max_cvar = self._format_constraint(max_cvar, "Max CVaR")
 
         def constraint_creator(d: OptData, cvar: float):
-            def constraint(w):
+            def constraint(w, grad=None):
                 w = format_weights(w, as_active_cvar)
-                return get_option("C.SCALE") * (cvar - d.cvar(w, self.rebalance, percentile))
+                s = get_option("C.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = -s * d.cvar_gradient(w, self.rebalance, percentile)
+                    format_gradient(grad, as_active_cvar)
+                return s * (cvar - d.cvar(w, self.rebalance, percentile))
 
             return constraint
 
@@ -36,9 +44,13 @@ class ConstraintBuilder(AbstractConstraintBuilder):
         min_ret = self._format_constraint(min_ret, "Min returns")
 
         def constraint_creator(d: OptData, ret: float):
-            def constraint(w):
+            def constraint(w, grad=None):
                 w = format_weights(w, as_active_returns)
-                return get_option("C.SCALE") * (ret - d.expected_return(w, self.rebalance))
+                s = get_option("C.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = -s * d.expected_return_gradient(w, self.rebalance)
+                    format_gradient(grad, as_active_returns)
+                return s * (ret - d.expected_return(w, self.rebalance))
 
             return constraint
 
@@ -58,3 +70,9 @@ class ConstraintBuilder(AbstractConstraintBuilder):
 
 def format_weights(w, active: bool):
     return [0, *w[1:]] if active else w
+
+
+def format_gradient(grad, active: bool):
+    """The first weight is replaced by 0 for active measures, thus the constraint does not depend on it"""
+    if active:
+        grad[0] = 0
@@ -7,9 +7,13 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
         """Maximizes the CVaR. This means that we're minimizing the losses"""
 
         def objective_creator(d: OptData, i: int):
-            def objective(w):
+            def objective(w, grad=None):
                 w = format_weights(w, active_cvar)
-                return (d.cvar(w, self.rebalance, percentile) - self.penalties[i](w)) * get_option("F.SCALE")
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.cvar_gradient(w, self.rebalance, percentile) - self.penalties[i].gradient(w)) * s
+                    format_gradient(grad, active_cvar)
+                return (d.cvar(w, self.rebalance, percentile) - self.penalties[i](w)) * s
 
             return objective
 
@@ -20,8 +24,11 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
         """Objective function to maximize the returns"""
 
         def objective_creator(d: OptData, i: int):
-            def objective(w):
-                return (d.expected_return(w, self.rebalance) - self.penalties[i](w)) * get_option("F.SCALE")
+            def objective(w, grad=None):
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.expected_return_gradient(w, self.rebalance) - self.penalties[i].gradient(w)) * s
+                return (d.expected_return(w, self.rebalance) - self.penalties[i](w)) * s
 
             return objective
 
@@ -30,8 +37,11 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
     @property
     def max_sharpe_ratio(self):
         def objective_creator(d: OptData, i: int):
-            def objective(w):
-                return (d.sharpe_ratio(w, self.rebalance) - self.penalties[i](w)) * get_option("F.SCALE")
+            def objective(w, grad=None):
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.sharpe_ratio_gradient(w, self.rebalance) - self.penalties[i].gradient(w)) * s
+                return (d.sharpe_ratio(w, self.rebalance) - self.penalties[i](w)) * s
 
             return objective
 
@@ -40,9 +50,13 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
     @property
     def max_info_ratio(self):
         def objective_creator(d: OptData, i: int):
-            def objective(w):
+            def objective(w, grad=None):
                 w = format_weights(w, True)
-                return (d.sharpe_ratio(w, self.rebalance) - self.penalties[i](w)) * get_option("F.SCALE")
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.sharpe_ratio_gradient(w, self.rebalance) - self.penalties[i].gradient(w)) * s
+                    format_gradient(grad, True)
+                return (d.sharpe_ratio(w, self.rebalance) - self.penalties[i](w)) * s
 
             return objective
 
@@ -50,9 +64,13 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
 
     def min_vol(self, is_tracking_error: bool):
         def objective_creator(d: OptData, i: int):
-            def objective(w):
+            def objective(w, grad=None):
                 w = format_weights(w, is_tracking_error)
-                return (d.volatility(w) + self.penalties[i](w)) * get_option("F.SCALE")
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.volatility_gradient(w) + self.penalties[i].gradient(w)) * s
+                    format_gradient(grad, is_tracking_error)
+                return (d.volatility(w) + self.penalties[i](w)) * s
 
             return objective
 
@@ -61,3 +79,9 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
 
 def format_weights(w, remove_first_value: bool):
     return [0, *w[1:]] if remove_first_value else w
+
+
+def format_gradient(grad, remove_first_value: bool):
+    """The first weight is replaced by 0 when it is removed, thus the objective does not depend on it"""
+    if remove_first_value:
+        grad[0] = 0
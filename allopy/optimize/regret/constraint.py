@@ -1,8 +1,11 @@
-from typing import Dict, List, Sized, Union
+from typing import Dict, Iterator, List, Optional, Sized, Tuple, Union
+
+import numpy as np
 
 from .types import Arg1Func, Arg2Func
 
 ConstraintFunc = Union[List[Arg1Func], List[Arg2Func]]
+MatrixConstraint = Tuple[np.ndarray, np.ndarray]
 
 
 class ConstraintMap:
@@ -10,8 +13,10 @@ class ConstraintMap:
         self.n = num_scenarios
         self._equality: Dict[str, ConstraintFunc] = {}
         self._inequality: Dict[str, ConstraintFunc] = {}
-        self._m_equality: Dict[str, ConstraintFunc] = {}
-        self._m_inequality: Dict[str, ConstraintFunc] = {}
+        # matrix constraints are shared by all scenarios, thus only the (A, b) pairs are kept. They are stacked and
+        # set on the model as a single vector-valued constraint
+        self._matrix_equality: List[MatrixConstraint] = []
+        self._matrix_inequality: List[MatrixConstraint] = []
 
     @property
     def equality(self):
@@ -22,12 +27,24 @@ class ConstraintMap:
         return self._inequality
 
     @property
-    def m_equality(self):
-        return self._m_equality
+    def matrix_equality(self):
+        return self._matrix_equality
 
     @property
-    def m_inequality(self):
-        return self._m_inequality
+    def matrix_inequality(self):
+        return self._matrix_inequality
+
+    def stacked_matrix(self, equality: bool) -> Optional[MatrixConstraint]:
+        """
+        Stacks all the (in)equality matrix constraints into a single (A, b) pair so that every scenario model
+        evaluates them with one vector-valued constraint. Returns None if there are no such constraints
+        """
+        matrices = self._matrix_equality if equality else self._matrix_inequality
+        if not matrices:
+            return None
+
+        A, b = zip(*matrices)
+        return np.vstack(A), np.concatenate(b)
 
     def add_equality_constraints(self, fns: ConstraintFunc):
         self._equality[self._rename(fns[0], self._equality.keys())] = fns
@@ -35,11 +52,21 @@ class ConstraintMap:
     def add_inequality_constraints(self, fns: ConstraintFunc):
         self._inequality[self._rename(fns[0], self._inequality.keys())] = fns
 
-    def add_matrix_equality_constraints(self, fns: ConstraintFunc):
-        self._m_equality[self._rename(fns[0], self._m_equality.keys())] = fns
+    def add_equality_matrix(self, Aeq: np.ndarray, beq: np.ndarray):
+        self._matrix_equality.append((Aeq, beq))
+
+    def add_inequality_matrix(self, A: np.ndarray, b: np.ndarray):
+        self._matrix_inequality.append((A, b))
+
+    def matrix_values(self, x: np.ndarray, equality: bool) -> Iterator[Tuple[str, float]]:
+        """Yields the name and value of every row of the (in)equality matrix constraints at x"""
+        prefix, matrices = ("AEQ", self._matrix_equality) if equality else ("A", self._matrix_inequality)
 
-    def add_matrix_inequality_constraints(self, fns: ConstraintFunc):
-        self._m_inequality[self._rename(fns[0], self._m_inequality.keys())] = fns
+        count = 0
+        for A, b in matrices:
+            for i, value in enumerate(A @ x - b):
+                count += 1
+                yield f"{prefix}_{i}_{count}", float(value)
 
     @staticmethod
     def _rename(fn: Union[Arg1Func, Arg2Func], names: Sized):
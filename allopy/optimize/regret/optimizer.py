@@ -1,3 +1,4 @@
+import os
 import warnings
 from inspect import isfunction
 from typing import Callable, List, Optional, Union
@@ -8,7 +9,7 @@ from allopy import get_option
 from allopy.optimize.algorithms import LD_SLSQP
 from allopy.optimize.utils import validate_tolerance
 from allopy.types import Numeric, OptArray
-from ._modelbuilder import ModelBuilder
+from ._modelbuilder import ModelBuilder, _read_only
 from ._operations import OptimizationOperation
 from .result import RegretOptimizerSolution, RegretResult
 from .summary import RegretSummary
@@ -33,7 +34,8 @@ class RegretOptimizer:
                  max_eval: Optional[int] = None,
                  verbose=False,
                  sum_to_1=True,
-                 max_attempts=5):
+                 max_attempts=5,
+                 n_jobs=1):
         r"""
         The RegretOptimizer is a convenience class for scenario based optimization.
 
@@ -131,6 +133,14 @@ class RegretOptimizer:
             Number of times to retry optimization. This is useful when optimization is in a highly unstable
             or non-convex space.
 
+        n_jobs: int
+            Number of scenarios whose first stage problems are solved concurrently. This is also the number of
+            threads evaluating the scenario objectives in the regret minimization. Defaults to 1, which solves the
+            scenarios one after another. Set to -1 to use all available cores. NLopt holds the GIL while it
+            optimizes, so the threads only overlap in the numpy calls of the objectives and the speed up is usually
+            small. Solving the scenarios concurrently also means a scenario without an initial vector can no longer
+            start from the solution of the previous scenario
+
         See Also
         --------
         :class:`DiscreteUncertaintyOptimizer`: Discrete Uncertainty Optimizer
@@ -154,14 +164,14 @@ class RegretOptimizer:
             verbose
         )
 
-        self._prob = np.ones(num_scenarios) / num_scenarios if prob is None else np.asarray(prob)
+        self.prob = prob
 
         # result formatting options
         self._result: Optional[RegretResult] = None
         self._solution: Optional[RegretOptimizerSolution] = None
 
-        assert isinstance(max_attempts, int) and max_attempts > 0, 'max_attempts must be an integer >= 1'
-        self._max_attempts = max_attempts
+        self.max_attempts = max_attempts
+        self.n_jobs = n_jobs
         self._verbose = verbose
 
     @property
@@ -172,10 +182,12 @@ class RegretOptimizer:
     @prob.setter
     def prob(self, prob: OptArray):
         if prob is None:
-            prob = np.ones(self._num_scenarios) / self._num_scenarios
+            prob = np.full(self._num_scenarios, 1 / self._num_scenarios)
+        else:
+            prob = np.ascontiguousarray(prob, dtype=np.float64)
 
-        assert len(prob) == self._num_scenarios, "probability vector length should equal number of scenarios"
-        self._prob = np.asarray(prob)
+        assert prob.shape == (self._num_scenarios,), "probability vector length should equal number of scenarios"
+        self._prob = prob
 
     @property
     def lower_bounds(self):
@@ -186,10 +198,11 @@ class RegretOptimizer:
     def lower_bounds(self, lb: Union[int, float, np.ndarray]):
         n = self._num_assets
         if isinstance(lb, (int, float)):
-            lb = np.repeat(float(lb), n)
+            lb = np.full(n, float(lb), np.float64)
 
         assert len(lb) == self._mb.num_assets, f"Input vector length must be {n}"
-        self._mb.lower_bounds = np.asarray(lb)
+        self._mb.lower_bounds = _read_only(np.array(lb, np.float64))
+        self._mb.invalidate()
 
     @property
     def upper_bounds(self):
@@ -200,10 +213,11 @@ class RegretOptimizer:
     def upper_bounds(self, ub: Union[int, float, np.ndarray]):
         n = self._num_assets
         if isinstance(ub, (int, float)):
-            ub = np.repeat(float(ub), n)
+            ub = np.full(n, float(ub), np.float64)
 
         assert len(ub) == n, f"Input vector length must be {n}"
-        self._mb.upper_bounds = np.asarray(ub)
+        self._mb.upper_bounds = _read_only(np.array(ub, np.float64))
+        self._mb.invalidate()
 
     def set_bounds(self, lb: Numeric, ub: Numeric):
         """
@@ -232,6 +246,7 @@ class RegretOptimizer:
     def sum_to_1(self, value: bool):
         assert isinstance(value, bool), "sum_to_1 must be a boolean value"
         self._mb.sum_to_1 = value
+        self._mb.invalidate()
 
     def set_max_objective(self, functions: ObjFunc):
         """
@@ -251,6 +266,7 @@ class RegretOptimizer:
             function will be used for all the scenarios
         """
         self._mb.max_or_min = 'maximize'
+        self._mb.invalidate()
         self._set_obj_func(functions)
         return self
 
@@ -272,6 +288,7 @@ class RegretOptimizer:
             function will be used for all the scenarios
         """
         self._mb.max_or_min = 'minimize'
+        self._mb.invalidate()
         self._set_obj_func(functions)
         return self
 
@@ -440,7 +457,7 @@ class RegretOptimizer:
         np.ndarray
             Regret optimal solution weights
         """
-        opt = OptimizationOperation(self._mb, self.prob, self.max_attempts, self.verbose) \
+        opt = OptimizationOperation(self._mb, self.prob, self.max_attempts, self.verbose, self.n_jobs) \
             .optimize(x0_first_level, x0_prop, initial_solution, approx, dist_func, random_state)
 
         self._result = opt.result
@@ -454,9 +471,21 @@ class RegretOptimizer:
 
     @max_attempts.setter
     def max_attempts(self, value: int):
-        assert isinstance(value, int) and value > 0, 'max_attempts must be an integer >= 1'
+        if not isinstance(value, int) or value <= 0:
+            raise ValueError('max_attempts must be an integer >= 1')
         self._max_attempts = value
 
+    @property
+    def n_jobs(self):
+        """Number of scenarios whose first stage problems are solved concurrently"""
+        return self._n_jobs
+
+    @n_jobs.setter
+    def n_jobs(self, value: int):
+        if not isinstance(value, int) or not (value > 0 or value == -1):
+            raise ValueError('n_jobs must be an integer >= 1 or -1')
+        self._n_jobs = os.cpu_count() if value == -1 else value
+
     @property
     def has_violations(self):
         if self._solution is None or self._result is None:
@@ -523,6 +552,7 @@ class RegretOptimizer:
         """
         assert isinstance(eps, float) and eps >= 0, "Epsilon must be a float that is >= 0"
         self._mb.c_eps = eps
+        self._mb.invalidate()
         return self
 
     def set_xtol_abs(self, tol: Union[float, np.ndarray]):
@@ -541,6 +571,7 @@ class RegretOptimizer:
             Absolute tolerance for each of the free variables
         """
         self._mb.x_tol_abs = validate_tolerance(tol)
+        self._mb.invalidate()
         return self
 
     def set_xtol_rel(self, tol: Union[float, np.ndarray]):
@@ -560,6 +591,7 @@ class RegretOptimizer:
             relative tolerance for each of the free variables
         """
         self._mb.x_tol_rel = validate_tolerance(tol)
+        self._mb.invalidate()
         return self
 
     def set_maxeval(self, n: int):
@@ -577,6 +609,7 @@ class RegretOptimizer:
         """
         assert isinstance(n, int), "max evaluation must be an integer"
         self._mb.max_eval = n
+        self._mb.invalidate()
         return self
 
     def set_ftol_abs(self, tol: float):
@@ -593,6 +626,7 @@ class RegretOptimizer:
             absolute tolerance of objective function value
         """
         self._mb.f_tol_abs = validate_tolerance(tol)
+        self._mb.invalidate()
         return self
 
     def set_ftol_rel(self, tol: Optional[float]):
@@ -611,6 +645,7 @@ class RegretOptimizer:
             Absolute relative of objective function value
        """
         self._mb.f_tol_rel = validate_tolerance(tol)
+        self._mb.invalidate()
         return self
 
     @property
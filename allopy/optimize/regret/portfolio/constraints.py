@@ -10,8 +10,11 @@ class ConstraintBuilder(AbstractConstraintBuilder):
         max_vol = self._format_constraint(max_vol, "Max volatility")
 
         def constraint_creator(d: OptData, vol: float):
-            def constraint(w):
-                return get_option("C.SCALE") * (d.volatility(w) - vol)
+            def constraint(w, grad=None):
+                s = get_option("C.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = s * d.volatility_gradient(w)
+                return s * (d.volatility(w) - vol)
 
             return constraint
 
@@ -22,8 +25,11 @@ class ConstraintBuilder(AbstractConstraintBuilder):
         max_cvar = self._format_constraint(max_cvar, "Max CVaR")
 
         def constraint_creator(d: OptData, cvar: float):
-            def constraint(w):
-                return get_option("C.SCALE") * (cvar - d.cvar(w, self.rebalance, percentile))
+            def constraint(w, grad=None):
+                s = get_option("C.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = -s * d.cvar_gradient(w, self.rebalance, percentile)
+                return s * (cvar - d.cvar(w, self.rebalance, percentile))
 
             return constraint
 
@@ -34,8 +40,11 @@ class ConstraintBuilder(AbstractConstraintBuilder):
         min_ret = self._format_constraint(min_ret, "Min returns")
 
         def constraint_creator(d: OptData, ret: float):
-            def constraint(w):
-                return get_option("C.SCALE") * (ret - d.expected_return(w, self.rebalance))
+            def constraint(w, grad=None):
+                s = get_option("C.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = -s * d.expected_return_gradient(w, self.rebalance)
+                return s * (ret - d.expected_return(w, self.rebalance))
 
             return constraint
 
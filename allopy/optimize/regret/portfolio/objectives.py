@@ -7,8 +7,11 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
         """Maximizes the CVaR. This means that we're minimizing the losses"""
 
         def objective_creator(d: OptData, i: int):
-            def objective(w):
-                return (d.cvar(w, self.rebalance, percentile) - self.penalties[i](w)) * get_option("F.SCALE")
+            def objective(w, grad=None):
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.cvar_gradient(w, self.rebalance, percentile) - self.penalties[i].gradient(w)) * s
+                return (d.cvar(w, self.rebalance, percentile) - self.penalties[i](w)) * s
 
             return objective
 
@@ -19,8 +22,11 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
         """Objective function to maximize the returns"""
 
         def objective_creator(d: OptData, i: int):
-            def objective(w):
-                return (d.expected_return(w, self.rebalance) - self.penalties[i](w)) * get_option("F.SCALE")
+            def objective(w, grad=None):
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.expected_return_gradient(w, self.rebalance) - self.penalties[i].gradient(w)) * s
+                return (d.expected_return(w, self.rebalance) - self.penalties[i](w)) * s
 
             return objective
 
@@ -29,8 +35,11 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
     @property
     def max_sharpe_ratio(self):
         def objective_creator(d: OptData, i: int):
-            def objective(w):
-                return (d.sharpe_ratio(w, self.rebalance) - self.penalties[i](w)) * get_option("F.SCALE")
+            def objective(w, grad=None):
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.sharpe_ratio_gradient(w, self.rebalance) - self.penalties[i].gradient(w)) * s
+                return (d.sharpe_ratio(w, self.rebalance) - self.penalties[i](w)) * s
 
             return objective
 
@@ -39,8 +48,11 @@ class ObjectiveBuilder(AbstractObjectiveBuilder):
     @property
     def min_vol(self):
         def objective_creator(d: OptData, i: int):
-            def objective(w):
-                return (d.volatility(w) + self.penalties[i](w)) * get_option("F.SCALE")
+            def objective(w, grad=None):
+                s = get_option("F.SCALE")
+                if grad is not None and grad.size > 0:
+                    grad[:] = (d.volatility_gradient(w) + self.penalties[i].gradient(w)) * s
+                return (d.volatility(w) + self.penalties[i](w)) * s
 
             return objective
 
@@ -1,10 +1,10 @@
-import inspect
 from dataclasses import dataclass
-from typing import Callable, List, Optional
+from typing import Callable, Dict, List, Optional
 
 import numpy as np
 
 from allopy import get_option
+from allopy.optimize.utils import _evaluate
 from ._modelbuilder import ModelBuilder
 
 
@@ -38,10 +38,15 @@ class RegretResult:
         self.tight_constraint: List[str] = []
         self.violations: List[str] = []
 
+        # every function is evaluated once here and the values are shared by the checks and the reports below
+        self._inequality_values = self._evaluate_constraints(mb.constraints.inequality)
+        self._equality_values = self._evaluate_constraints(mb.constraints.equality)
+        self._f_values = np.array([_evaluate(f, s) for f, s in zip(mb.obj_funcs, self.scenario_solutions)])
+
         self._check_matrix_constraints(mb.constraints, eps)
-        self._check_functional_constraints(mb.constraints, eps)
+        self._check_functional_constraints(eps)
 
-        self.scenario_objective_values = self._derive_scenario_objective_values(mb)
+        self.scenario_objective_values = self._f_values / get_option("F.SCALE")
         self.regret_value = self._derive_regret_value(mb, dist_func)
         self.constraint_values = self._derive_constraint_values(mb)
 
@@ -77,67 +82,56 @@ class RegretResult:
 
         self._scenarios = value
 
-    def _check_functional_constraints(self, constraints, eps):
-        for name, cstr in constraints.inequality.items():
-            for i, f in enumerate(cstr):
-                value = f(self.solution)
+    def _evaluate_constraints(self, constraint_map) -> Dict[str, List[float]]:
+        return {name: [_evaluate(f, self.solution) for f in fns] for name, fns in constraint_map.items()}
+
+    def _check_functional_constraints(self, eps):
+        for name, values in self._inequality_values.items():
+            for i, value in enumerate(values):
                 if np.isclose(value, 0, atol=eps):
                     self.tight_constraint.append(f"{name}-{i}")
                 elif value > eps:
                     self.violations.append(f"{name}-{i}")
 
-        for name, cstr in constraints.equality.items():
-            for i, f in enumerate(cstr):
-                if abs(f(self.solution)) > eps:
+        for name, values in self._equality_values.items():
+            for i, value in enumerate(values):
+                if abs(value) > eps:
                     self.violations.append(f"{name}-{i}")
 
     def _check_matrix_constraints(self, constraints, eps):
-        for name, fns in constraints.m_equality.items():
-            for f in fns:
-                value = f(self.solution)
-                if abs(value) <= eps:
-                    self.tight_constraint.append(name)
-                elif value > eps:
-                    self.violations.append(name)
+        # matrix constraints are the same for every scenario, thus each row is only checked once
+        for name, value in constraints.matrix_values(self.solution, equality=False):
+            if abs(value) <= eps:
+                self.tight_constraint.append(name)
+            elif value > eps:
+                self.violations.append(name)
 
-        for name, fns in constraints.m_inequality.items():
-            for f in fns:
-                if abs(f(self.solution)) > eps:
-                    self.violations.append(name)
-
-    def _derive_scenario_objective_values(self, mb: ModelBuilder):
-        values = []
-        for f, s in zip(mb.obj_funcs, self.scenario_solutions):
-            if len(inspect.signature(f).parameters) == 1:
-                v = f(s)
-            else:  # number of parameters can only be 2 in this case
-                grad = np.ones((self.num_assets, self.num_assets))  # filler gradient, not necessary
-                v = f(s, grad)
-            values.append(v / get_option("F.SCALE"))
-
-        return np.array(values)
+        for name, value in constraints.matrix_values(self.solution, equality=True):
+            if abs(value) > eps:
+                self.violations.append(name)
 
     def _derive_regret_value(self, mb: ModelBuilder, dist_func: Callable[[np.ndarray], np.ndarray]) -> float:
-        f_values = np.array([f(s) for f, s in zip(mb.obj_funcs, self.scenario_solutions)])
-        curr_f_values = np.array([f(self.solution) for f in mb.obj_funcs])
+        curr_f_values = np.array([_evaluate(f, self.solution) for f in mb.obj_funcs])
 
-        cost = dist_func(f_values - curr_f_values) / get_option("F.SCALE")
-        return sum(self.probability * cost)
+        cost = dist_func(self._f_values - curr_f_values) / get_option("F.SCALE")
+        return float(self.probability @ cost)
 
     def _derive_constraint_values(self, mb: ModelBuilder):
         constraints = []
-        for eq, constraint_map in [("<=", mb.constraints.m_inequality),
-                                   ("<=", mb.constraints.inequality),
-                                   ("=", mb.constraints.m_equality),
-                                   ("=", mb.constraints.equality)]:
-            for name, fns in constraint_map.items():
-                for f, s in zip(fns, self.scenarios):
-                    if len(inspect.signature(f).parameters) == 1:
-                        v = f(self.solution)
-                    else:  # number of parameters can only be 2 in this case
-                        grad = np.ones((self.num_assets, self.num_assets))  # filler gradient, not necessary
-                        v = f(self.solution, grad)
+        for eq, equality, constraint_values in [("<=", False, self._inequality_values),
+                                                ("=", True, self._equality_values)]:
+            # matrix constraints have the same value in every scenario
+            for name, v in mb.constraints.matrix_values(self.solution, equality):
+                for s in self.scenarios:
+                    constraints.append({
+                        "Name": name,
+                        "Scenario": s,
+                        "Equality": eq,
+                        "Value": v / get_option("C.SCALE")
+                    })
 
+            for name, values in constraint_values.items():
+                for v, s in zip(values, self.scenarios):
                     constraints.append({
                         "Name": name,
                         "Scenario": s,
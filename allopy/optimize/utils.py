@@ -1,27 +1,195 @@
-from typing import Callable
+import inspect
+import threading
+import weakref
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Callable, Optional
 
 import numpy as np
 
-__all__ = ["create_gradient_func",
+__all__ = ["create_complex_step_gradient_func",
+           "create_gradient_func",
            "create_matrix_constraint",
+           "create_matrix_mconstraint",
+           "project_to_simplex",
+           "sum_equal_1",
            "validate_matrix_constraints",
            "validate_tolerance"]
 
+# central difference coefficients and step multiples for the first derivative, keyed by the number of points.
+# The 4 point stencil is the Richardson extrapolation of the 2 point one
+_FD_COEFFS = {
+    2: (np.array([-1 / 2, 1 / 2]), np.array([-1., 1.])),
+    4: (np.array([1 / 12, -2 / 3, 2 / 3, -1 / 12]), np.array([-2., -1., 1., 2.])),
+}
 
-def create_gradient_func(fn, eps) -> Callable[[np.ndarray, np.ndarray], float]:
-    def f(w, grad):
-        diag = np.eye(len(w)) * eps
+
+@lru_cache(maxsize=None)
+def _unit_basis(n: int) -> np.ndarray:
+    basis = np.eye(n)
+    basis.setflags(write=False)
+    return basis
+
+
+def create_gradient_func(fn,
+                         eps,
+                         executor: Optional[Executor] = None,
+                         points: int = 2,
+                         batched: bool = False) -> Callable[[np.ndarray, np.ndarray], float]:
+    """
+    Creates a gradient function with central differences. If batched, :code:`fn` must also accept a 2D array of
+    points (one per row) and return a vector of values, all perturbations are then evaluated in a single call
+    """
+    return _FiniteDifferenceGradient(fn, eps, executor, points, batched)
+
+
+class _FiniteDifferenceGradient:
+    def __init__(self, fn, eps: float, executor: Optional[Executor], points: int, batched: bool = False):
+        assert points in _FD_COEFFS, f"number of finite difference points must be one of {list(_FD_COEFFS)}"
+
+        self.fn = fn
+        self.eps = eps
+        self.executor = executor
+        self.batched = batched
+        self.coefs, self.steps = _FD_COEFFS[points]
+
+        # line searches often re-evaluate the function at the same point. The last point (as raw bytes) is kept
+        # together with its value and gradient so that these repeated evaluations can be skipped. This state and
+        # the scratch vector are kept per thread as copies of the model may be optimized concurrently
+        self._state = threading.local()
+
+    def reset(self):
+        """
+        Forgets the memoized point. The function may read state which changed since it was last called, so this is
+        done whenever an optimization starts
+        """
+        self._state = threading.local()
+
+    def __call__(self, w: np.ndarray, grad: np.ndarray):
+        state = self._state
+        key = w.tobytes()
+        if key == getattr(state, 'key', None) and (grad.size == 0 or state.grad is not None):
+            if grad.size > 0:
+                grad[:] = state.grad
+            return state.fx
+
+        if grad.size > 0:
+            if self.batched:
+                self._batched_gradient(w, grad)
+            elif self.executor is None:
+                self._sequential_gradient(w, grad)
+            else:
+                self._concurrent_gradient(w, grad)
+
+        state.key, state.fx = key, self.fn(w)
+        state.grad = grad.copy() if grad.size > 0 else None
+        return state.fx
+
+    def _sequential_gradient(self, w: np.ndarray, grad: np.ndarray):
+        fn, eps = self.fn, self.eps
+
+        # scratch vector which is perturbed in place, one coordinate at a time
+        xp = getattr(self._state, 'xp', None)
+        if xp is None or len(xp) != len(w):
+            xp = self._state.xp = np.empty(len(w), np.float64)
+        np.copyto(xp, w)
+
+        for i in range(len(w)):
+            value = 0.0
+            for c, s in zip(self.coefs, self.steps):
+                xp[i] = w[i] + s * eps
+                value += c * fn(xp)
+            xp[i] = w[i]
+            grad[i] = value / eps
+
+    def _concurrent_gradient(self, w: np.ndarray, grad: np.ndarray):
+        # each perturbation is independent, thus they can be evaluated concurrently. Every task needs its own
+        # vector so the scratch buffer is not used here
+        n, eps = len(w), self.eps
+        basis = _unit_basis(n)
+        values = [np.fromiter(self.executor.map(self.fn, w + s * eps * basis), np.float64, n) for s in self.steps]
+        grad[:] = sum(c * v for c, v in zip(self.coefs, values)) / eps
+
+    def _batched_gradient(self, w: np.ndarray, grad: np.ndarray):
+        # every perturbed point is a row of one matrix, laid out stencil point by stencil point
+        n, eps = len(w), self.eps
+        points = (w + (self.steps * eps)[:, None, None] * _unit_basis(n)).reshape(-1, n)
+        values = np.asarray(self.fn(points), np.float64).reshape(len(self.steps), n)
+        grad[:] = self.coefs @ values / eps
+
+
+# parameter counts of callables which had to go through inspect.signature. Weakly keyed so that the cache does not keep
+# the (often data capturing) closures alive
+_PARAMETER_COUNTS = weakref.WeakKeyDictionary()
+
+
+def _count_parameters(fn: Callable) -> int:
+    """
+    Counts the parameters of the function, same as :code:`len(inspect.signature(fn).parameters)`. Plain functions and
+    methods are read off their code object directly as building the full signature is comparatively slow. Decorated
+    functions and other callables still go through the signature as it follows the :code:`__wrapped__` chain, the
+    count is then cached
+    """
+    if (inspect.isfunction(fn) or inspect.ismethod(fn)) and not hasattr(fn, '__wrapped__'):
+        code = fn.__code__
+        count = code.co_argcount + code.co_kwonlyargcount
+        count += bool(code.co_flags & inspect.CO_VARARGS) + bool(code.co_flags & inspect.CO_VARKEYWORDS)
+        return count - inspect.ismethod(fn)
+
+    try:
+        return _PARAMETER_COUNTS[fn]
+    except (KeyError, TypeError):
+        count = len(inspect.signature(fn).parameters)
+
+    try:
+        _PARAMETER_COUNTS[fn] = count
+    except TypeError:  # not weak referenceable or not hashable
+        pass
+    return count
+
+
+def _evaluate(fn: Callable, x: np.ndarray) -> float:
+    """
+    Evaluates the function at x. Functions which take a gradient are given a gradient buffer shaped like x, so that
+    functions which write into it unconditionally still work. The gradient is discarded
+    """
+    if _count_parameters(fn) == 1:
+        return fn(x)
+    return fn(x, np.empty(len(x)))
+
+
+def create_complex_step_gradient_func(fn, h: float = 1e-30) -> Callable[[np.ndarray, np.ndarray], float]:
+    r"""
+    Creates a gradient function with the complex step derivative, :math:`f'(x) = \Im f(x + ih) / h`. As there is no
+    subtraction, there is no cancellation error and the step can be tiny. The function must be analytic in its input
+    and work on complex arrays, otherwise the derivative is wrong
+    """
+
+    def gradient_fn(w: np.ndarray, grad: np.ndarray):
         if grad.size > 0:
-            for i, c in enumerate(diag):
-                grad[i] = (fn(w + c) - fn(w - c)) / (2 * eps)
+            xc = w.astype(np.complex128)
+            for i in range(len(w)):
+                xc[i] += 1j * h
+                grad[i] = np.imag(fn(xc)) / h
+                xc[i] = w[i]
+
         return fn(w)
 
-    return f
+    return gradient_fn
+
 
+def create_matrix_constraint(a, b, name: str = None) -> Callable[[np.ndarray, Optional[np.ndarray]], float]:
+    # these are called once per row on every iteration, thus the row's bound dot method and a plain float limit are
+    # captured up front to keep the per call overhead down. The gradient of an affine constraint is the row itself
+    # so it is set directly instead of being derived numerically
+    a = np.ascontiguousarray(a, dtype=np.float64)
+    dot = a.dot
+    b = float(b)
 
-def create_matrix_constraint(a, b, name: str = None) -> Callable[[np.ndarray], float]:
-    def fn(w):
-        return a @ w - b
+    def fn(w, grad=None):
+        if grad is not None and grad.size > 0:
+            grad[:] = a
+        return dot(w) - b
 
     if name is not None:
         fn.__name__ = name
@@ -29,17 +197,50 @@ def create_matrix_constraint(a, b, name: str = None) -> Callable[[np.ndarray], f
     return fn
 
 
+def create_matrix_mconstraint(A, b) -> Callable[[np.ndarray, np.ndarray, np.ndarray], None]:
+    r"""
+    Creates a single vector-valued constraint function evaluating all rows of :math:`A \cdot x - b` at once.
+    The Jacobian of an affine constraint is :math:`A` itself, so no numerical gradient is needed.
+    """
+    A = np.ascontiguousarray(A, dtype=np.float64)
+    b = np.ascontiguousarray(b, dtype=np.float64)
+
+    def fn(result, w, grad):
+        np.dot(A, w, out=result)
+        result -= b
+        if grad.size > 0:
+            grad[:] = A
+
+    return fn
+
+
+def project_to_simplex(v: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto the set of non-negative vectors which sum to 1"""
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u) - 1
+    rho = np.nonzero(u * np.arange(1, len(v) + 1) > css)[0][-1]
+    return np.maximum(v - css[rho] / (rho + 1), 0)
+
+
+def sum_equal_1(w, grad=None):
+    """Weights must sum to 1. The gradient is a constant vector of ones so it is set analytically"""
+    if grad is not None and grad.size > 0:
+        grad[:] = 1.0
+    return w.sum() - 1
+
+
 def validate_matrix_constraints(A, b):
-    A = np.asarray(A)
-    b = np.asarray(b)
+    A = np.ascontiguousarray(A, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
 
     assert A.ndim == 2, '(In)-Equality matrix `A` must be 2 dimensional!'
 
     if b.size == 1:
-        b = np.repeat(float(b), len(A))
+        b = b.reshape(1)
     assert b.ndim == 1, '`b` vector must be 1 dimensional or a scalar'
+    assert len(b) in (1, len(A)), '`b` vector must have as many elements as there are rows in `A`'
 
-    return A, b
+    return A, np.broadcast_to(b, len(A)).copy()
 
 
 def validate_tolerance(tol):
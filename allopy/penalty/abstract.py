@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 import numpy as np
 
+from allopy._config import get_option
+
 
 class Penalty(ABC):
     dim = 0
@@ -11,5 +13,23 @@ class Penalty(ABC):
         """The cost incurred by the penalty function"""
         pass
 
+    def gradient(self, w: np.ndarray) -> np.ndarray:
+        """
+        The gradient of the cost. Penalties without an analytic gradient have it derived with central differences
+        """
+        w = np.array(w, dtype=np.float64)
+        eps = get_option('EPS.STEP')
+        grad = np.empty(len(w))
+
+        for i, v in enumerate(w):
+            w[i] = v + eps
+            upper = self.cost(w)
+            w[i] = v - eps
+            lower = self.cost(w)
+            w[i] = v
+            grad[i] = (upper - lower) / (2 * eps)
+
+        return grad
+
     def __call__(self, w: np.ndarray):
         return self.cost(w)
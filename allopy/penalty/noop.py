@@ -25,5 +25,8 @@ class NoPenalty(Penalty):
         """
         return 0
 
+    def gradient(self, w: np.ndarray) -> np.ndarray:
+        return np.zeros(len(w))
+
     def __str__(self):
         return f"NoPenalty(dim={self.dim})"
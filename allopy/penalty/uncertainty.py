@@ -63,6 +63,17 @@ class UncertaintyPenalty(Penalty):
         """
         return self._alpha * (w @ self._uncertainty @ w) ** 0.5
 
+    def gradient(self, w: np.ndarray) -> np.ndarray:
+        r"""
+        Calculates the gradient of the penalty
+
+        .. math::
+            \nabla p(w) = \lambda \frac{\Phi w}{\sqrt{w^T \Phi w}}
+        """
+        phi_w = (self._uncertainty + self._uncertainty.T) @ np.asarray(w) / 2
+        cost = float(np.asarray(w) @ phi_w) ** 0.5
+        return self._alpha * phi_w / cost if cost > 0 else np.zeros_like(phi_w)
+
     @property
     def uncertainty(self):
         return self._uncertainty
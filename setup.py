@@ -13,7 +13,7 @@ install_requires = [
     'numpy >=1.16',
     'nlopt >=2.6',
     'requests',
-    'scipy >=1.3',
+    'scipy >=1.7',
     'statsmodels >=0.10',
     'pandas >=0.25'
 ]
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from allopy import OptData
+from allopy.optimize.portfolio.active.constraints import ConstraintBuilder
+from allopy.optimize.portfolio.active.objectives import ObjectiveBuilder
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.RandomState(5)
+    return OptData(rng.normal(np.linspace(0.005, 0.02, 4), np.linspace(0.01, 0.06, 4), size=(12, 2000, 4)),
+                   'quarterly')
+
+
+def assert_gradient(fn, w, eps=1e-6):
+    grad = np.empty(len(w))
+    fn(w, grad)
+    expected = [(fn(w + e) - fn(w - e)) / (2 * eps) for e in np.eye(len(w)) * eps]
+    assert_allclose(grad, expected, atol=1e-6)
+    return grad
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+@pytest.mark.parametrize("active", [True, False])
+def test_active_constraint_gradients(data, rebalance, active):
+    builder = ConstraintBuilder(data, data, rebalance)
+    w = np.array([1.0, 0.1, -0.05, 0.2])
+
+    for fn in (builder.max_vol(0.03, active), builder.max_cvar(-0.2, 5.0, active), builder.min_returns(0.01, active)):
+        grad = assert_gradient(fn, w)
+        if active:
+            assert grad[0] == 0
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+@pytest.mark.parametrize("active", [True, False])
+def test_active_objective_gradients(data, rebalance, active):
+    builder = ObjectiveBuilder(data, data, rebalance)
+    w = np.array([1.0, 0.1, -0.05, 0.2])
+
+    for fn in (builder.max_cvar(active, 5.0), builder.min_volatility(active)):
+        grad = assert_gradient(fn, w)
+        if active:
+            assert grad[0] == 0
+
+    assert assert_gradient(builder.max_info_ratio, w)[0] == 0
+    assert_gradient(builder.max_returns, w)
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from numpy.testing import assert_almost_equal
 
@@ -75,7 +76,8 @@ def test_constrained_optimization(initial_solution, random_state):
     assert obj(w) < obj(expected) or assert_almost_equal(w, expected)
 
 
-def test_matrix_constrained_optimization():
+@pytest.mark.parametrize("gradient_method", ["central", "complex", "batched"])
+def test_matrix_constrained_optimization(gradient_method):
     r"""
     Maximize the Rosenbrock function
 
@@ -89,16 +91,17 @@ def test_matrix_constrained_optimization():
         0 \leq x \leq 1 \\
         0.5 \leq y \leq 2
     """
-    model = BaseOptimizer(2)
+    model = BaseOptimizer(2, gradient_method=gradient_method)
 
+    # indexed along the last axis so that the functions also take the 2D batches of the batched gradient
     def obj(w):
-        return 100 * (w[1] - w[0] ** 2) ** 2 - (1 - w[0]) ** 2
+        return 100 * (w[..., 1] - w[..., 0] ** 2) ** 2 - (1 - w[..., 0]) ** 2
 
     def c1(w):
-        return w[0] ** 2 + w[1] - 1
+        return w[..., 0] ** 2 + w[..., 1] - 1
 
     def c2(w):
-        return w[0] ** 2 - w[1] - 1
+        return w[..., 0] ** 2 - w[..., 1] - 1
 
     model.set_min_objective(obj)
     model.add_inequality_constraint(c1)
@@ -108,9 +111,58 @@ def test_matrix_constrained_optimization():
     model.set_bounds([0, -0.5], [1, 2])
     w = model.optimize([0.5, 0.5])
 
-    expected = [0.41494475, 0.1701105]
+    expected = np.array([0.41494475, 0.1701105])
     assert obj(w) < obj(expected) or assert_almost_equal(w, expected)
 
 
 def test_summary(model):
     assert model.summary() is not None
+
+
+def test_numerical_gradient_not_stale_across_solves():
+    state = {"target": 0.3}
+
+    def obj(w):
+        return ((w - state["target"]) ** 2).sum()
+
+    model = BaseOptimizer(2)
+    model.set_min_objective(obj)
+    model.set_bounds(0, 1)
+    w = model.optimize([0.5, 0.5])
+    assert_almost_equal(w, [0.3, 0.3], 4)
+
+    # the objective now reads different state. Starting from the last optimum must not reuse its memoized value
+    state["target"] = 0.7
+    model.set_min_objective(obj)
+    assert_almost_equal(model.optimize(w), [0.7, 0.7], 4)
+
+
+
+def test_shared_gradient_wrappers_respect_finite_difference_settings():
+    def obj(w):
+        return ((w - 0.3) ** 2).sum()
+
+    two_points = BaseOptimizer(2, fd_points=2)
+    four_points = BaseOptimizer(2, fd_points=4)
+    four_points._grad_funcs = two_points._grad_funcs
+    assert two_points._set_gradient(obj) is not four_points._set_gradient(obj)
+
+    with BaseOptimizer(2, n_jobs=2) as threaded:
+        threaded._grad_funcs = two_points._grad_funcs
+        assert threaded._set_gradient(obj) is not two_points._set_gradient(obj)
+
+    same = BaseOptimizer(2, fd_points=2)
+    same._grad_funcs = two_points._grad_funcs
+    assert same._set_gradient(obj) is two_points._set_gradient(obj)
+
+def test_n_jobs_threads_are_closed():
+    with pytest.raises(ValueError):
+        BaseOptimizer(2, n_jobs=0)
+
+    with BaseOptimizer(2, n_jobs=2) as model:
+        model.set_min_objective(lambda w: ((w - 0.3) ** 2).sum())
+        model.set_bounds(0, 1)
+        assert_almost_equal(model.optimize([0.5, 0.5]), [0.3, 0.3], 4)
+
+    # gradients are computed sequentially once the threads are shut down
+    assert_almost_equal(model.optimize([0.5, 0.5]), [0.3, 0.3], 4)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from allopy import OptData
+
+
+def central_difference(f, w, eps=1e-6):
+    basis = np.eye(len(w)) * eps
+    return np.array([(np.asarray(f(w + e)) - np.asarray(f(w - e))) / (2 * eps) for e in basis]).T
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.RandomState(3)
+    return OptData(rng.normal(np.linspace(0.005, 0.02, 4), np.linspace(0.01, 0.06, 4), size=(20, 2000, 4)),
+                   'quarterly')
+
+
+@pytest.fixture(scope="module")
+def w():
+    return np.array([0.1, 0.2, 0.3, 0.4])
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+@pytest.mark.parametrize("measure", ["cvar", "expected_return", "sharpe_ratio"])
+def test_gradient(data, w, measure, rebalance):
+    fn = getattr(data, measure)
+    gradient = getattr(data, f"{measure}_gradient")
+
+    assert_allclose(gradient(w, rebalance), central_difference(lambda x: fn(x, rebalance), w), atol=1e-6)
+
+
+def test_volatility_gradient(data, w):
+    assert_allclose(data.volatility_gradient(w), central_difference(data.volatility, w), atol=1e-6)
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+def test_portfolio_returns_jacobian(data, w, rebalance):
+    expected = central_difference(lambda x: data.portfolio_returns(x, rebalance), w)
+    assert_allclose(data.portfolio_returns_jacobian(w, rebalance), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+def test_cache_cleared_when_data_modified_in_place(w, rebalance):
+    rng = np.random.RandomState(5)
+    data = OptData(rng.normal(0.01, 0.05, size=(20, 500, 4)), 'quarterly')
+    data.cvar(w, rebalance)
+    data.cvar_gradient(w, rebalance)
+
+    data[:] = data * 2
+    fresh = OptData(np.asarray(data), 'quarterly')
+    assert_allclose(data.cvar(w, rebalance), fresh.cvar(w, rebalance))
+    assert_allclose(data.cvar_gradient(w, rebalance), fresh.cvar_gradient(w, rebalance))
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from allopy.penalty import UncertaintyPenalty
+
+
+@pytest.mark.parametrize("uncertainty", [
+    [0.1, 0.2, 0.05],
+    [[0.1, 0.02, 0.0],
+     [0.02, 0.2, 0.01],
+     [0.0, 0.01, 0.05]],
+])
+def test_uncertainty_penalty_gradient(uncertainty):
+    penalty = UncertaintyPenalty(uncertainty, alpha=0.95)
+    w = np.array([0.3, 0.5, 0.2])
+
+    eps = 1e-6
+    expected = [(penalty.cost(w + e) - penalty.cost(w - e)) / (2 * eps) for e in np.eye(3) * eps]
+    assert_allclose(penalty.gradient(w), expected, atol=1e-8)
+    assert_allclose(penalty.gradient(np.zeros(3)), 0)
@@ -0,0 +1,12 @@
+import numpy as np
+import pytest
+
+from allopy import OptData
+
+
+@pytest.fixture(scope="package")
+def data():
+    rng = np.random.RandomState(42)
+    mu = np.linspace(0.005, 0.02, 5)
+    sd = np.linspace(0.01, 0.06, 5)
+    return OptData(rng.normal(mu, sd, size=(40, 1000, 5)), 'quarterly')
@@ -0,0 +1,134 @@
+import time
+import warnings
+
+import numpy as np
+import pytest
+from numpy.testing import assert_almost_equal
+
+from allopy import PortfolioOptimizer
+from allopy.optimize.base.base import _worker_state
+from allopy.penalty import UncertaintyPenalty
+
+
+@pytest.mark.parametrize("parallel_restarts", [3, 4])
+def test_parallel_restarts_are_reproducible(data, parallel_restarts):
+    def solve(restarts):
+        opt = PortfolioOptimizer(data, parallel_restarts=restarts)
+        opt.set_bounds(0, 0.6)
+        with warnings.catch_warnings():
+            # the restart points must be drawn in powers of 2 to keep the balance properties of the Sobol sequence
+            warnings.filterwarnings("error", message=".*balance properties.*")
+            return opt.maximize_returns(max_vol=0.05, random_state=1)
+
+    w = solve(parallel_restarts)
+    assert_almost_equal(solve(parallel_restarts), w)
+    assert_almost_equal(solve(1), w, 4)
+    assert np.isclose(w.sum(), 1)
+
+
+def test_parallel_restarts_fail_when_callback_raises(data):
+    def unstable(w):
+        raise RuntimeError("cannot be evaluated")
+
+    opt = PortfolioOptimizer(data, parallel_restarts=2, max_attempts=4)
+    opt.set_bounds(0, 0.6)
+    opt.add_inequality_constraint(unstable)
+    assert np.isnan(opt.maximize_returns(max_vol=0.05, random_state=1)).all()
+
+
+@pytest.mark.parametrize("max_cvars", [[-0.03, 0.0], [-0.045, 0.01]])
+def test_max_cvar_constraints(data, max_cvars):
+    percentiles = [5.0, 10.0]
+
+    def solve(as_vector: bool):
+        opt = PortfolioOptimizer(data)
+        opt.set_bounds(0, 0.6)
+        if as_vector:
+            opt.add_max_cvar_constraints(max_cvars, percentiles)
+        else:
+            for limit, percentile in zip(max_cvars, percentiles):
+                opt.add_inequality_constraint(opt._constraints.max_cvar(limit, percentile))
+
+        opt.set_max_objective(opt._objectives.max_returns)
+        return opt.optimize(random_state=1)
+
+    w = solve(True)
+    cvars = np.array([data.cut_by_horizon(3).cvar(w, False, p) for p in percentiles])
+    assert np.all(cvars >= np.array(max_cvars) - 1e-6)
+    assert np.isclose(cvars, max_cvars, atol=1e-6).any(), "at least one of the constraints should be binding"
+
+    assert_almost_equal(solve(False), w, 5)
+
+
+def _numerical_min_vol(opt: PortfolioOptimizer):
+    opt.set_min_objective(opt._objectives.min_vol)
+    return opt.optimize(random_state=1)
+
+
+def test_min_vol_closed_form(data):
+    opt = PortfolioOptimizer(data)
+    opt.set_bounds(0, 1)
+    w = opt._min_variance_portfolio()
+    assert w is not None, "only the sum to 1 constraint applies, the closed form should be used"
+    assert_almost_equal(opt.minimize_volatility(), w)
+
+    opt = PortfolioOptimizer(data)
+    opt.set_bounds(0, 1)
+    assert_almost_equal(_numerical_min_vol(opt), w, 4)
+
+
+@pytest.mark.parametrize("setup", [
+    lambda opt: opt.add_inequality_constraint(opt._constraints.min_returns(0.04)),
+    lambda opt: setattr(opt, "penalty", UncertaintyPenalty(np.linspace(0.01, 0.05, 5))),
+    lambda opt: opt.set_bounds(0.1, 0.25),
+], ids=["constraint", "penalty", "binding bounds"])
+def test_min_vol_falls_back_to_nlopt(data, setup):
+    def create():
+        opt = PortfolioOptimizer(data)
+        opt.set_bounds(0, 1)
+        setup(opt)
+        return opt
+
+    opt = create()
+    assert opt._min_variance_portfolio() is None
+    w = opt.minimize_volatility()
+    assert_almost_equal(w, _numerical_min_vol(create()), 4)
+    assert np.all(w >= opt.lower_bounds - 1e-6) and np.all(w <= opt.upper_bounds + 1e-6)
+
+
+def test_default_cvar_data_is_an_independent_copy(data):
+    opt = PortfolioOptimizer(data.copy())
+    original = np.asarray(opt.data).copy()
+
+    opt.cvar_data.calibrate_data(sd=np.full(5, 0.02), inplace=True)
+    assert_almost_equal(np.asarray(opt.data), original)
+
+
+def test_parallel_restarts_stop_once_solution_is_accepted(data):
+    x0 = np.full(5, 0.2)
+    target = np.array([0.1, 0.15, 0.2, 0.25, 0.3])
+    evaluations = {}
+
+    def objective(w, grad):
+        # attempt 0 starts from x0, the other attempts start from the Sobol points
+        counts = evaluations.setdefault(id(_worker_state.model), [np.allclose(w, x0), 0])
+        counts[1] += 1
+        # releases the GIL so that the attempts of the batch run side by side, the other attempts are much slower
+        time.sleep(0.001 if counts[0] else 0.05)
+
+        if grad.size > 0:
+            grad[:] = -2 * (w - target)
+        return -np.sum((w - target) ** 2)
+
+    # a batch of 8 attempts on 5 threads, thus at least 2 attempts are still queued once attempt 0 is done
+    opt = PortfolioOptimizer(data, parallel_restarts=5, max_attempts=8)
+    opt.set_bounds(0, 0.6)
+    opt.set_max_objective(objective)
+    assert_almost_equal(opt.optimize(x0, random_state=1), target, 4)
+
+    # the queued attempts never start and the running ones are not evaluated past the point where the solution of
+    # attempt 0 is accepted
+    first = [n for is_first, n in evaluations.values() if is_first]
+    others = [n for is_first, n in evaluations.values() if not is_first]
+    assert len(first) == 1 and first[0] > 1
+    assert len(others) <= 5 and all(n <= 2 for n in others)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_almost_equal
+
+from allopy import RegretOptimizer
+
+_MUS = np.array([[0.04, 0.01, 0.02],
+                 [0.01, 0.05, 0.02]])
+
+
+def _linear_objective(mu):
+    def obj_fun(w):
+        return mu @ w
+
+    return obj_fun
+
+
+@pytest.fixture
+def optimizer():
+    opt = RegretOptimizer(3, 2, sum_to_1=True)
+    opt.set_bounds(0, 0.6)
+    opt.set_max_objective([_linear_objective(mu) for mu in _MUS])
+    return opt
+
+
+def test_bounds_change_rebuilds_models(optimizer):
+    optimizer.optimize(random_state=1)
+    model = optimizer._mb(0)
+    assert_almost_equal(model.optimize(), [0.6, 0, 0.4], 4)
+
+    optimizer.set_bounds(0, 0.5)
+    model = optimizer._mb(0)
+    assert_almost_equal(model.upper_bounds, [0.5] * 3)
+    assert_almost_equal(model.optimize(), [0.5, 0, 0.5], 4)
+    assert optimizer.optimize(random_state=1).max() <= 0.5 + 1e-6
+
+
+def test_bounds_cannot_change_in_place(optimizer):
+    with pytest.raises(ValueError):
+        optimizer.upper_bounds[0] = 0.2
+
+    bounds = np.full(3, 0.6)
+    optimizer.upper_bounds = bounds
+    bounds[0] = 0.2
+    assert_almost_equal(optimizer.upper_bounds, [0.6] * 3)
+
+
+def test_constraint_change_rebuilds_models(optimizer):
+    optimizer.optimize(random_state=1)
+    assert_almost_equal(optimizer._mb(0).optimize(), [0.6, 0, 0.4], 4)
+
+    # caps the first asset at 30%
+    optimizer.add_inequality_matrix_constraint(np.array([[1, 0, 0]]), np.array([0.3]))
+    assert_almost_equal(optimizer._mb(0).optimize(), [0.3, 0.1, 0.6], 4)
+    assert optimizer.optimize(random_state=1)[0] <= 0.3 + 1e-6
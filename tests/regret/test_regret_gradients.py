@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from allopy.optimize.regret.active.constraints import ConstraintBuilder as ActiveConstraintBuilder
+from allopy.optimize.regret.active.objectives import ObjectiveBuilder as ActiveObjectiveBuilder
+from allopy.optimize.regret.portfolio.constraints import ConstraintBuilder
+from allopy.optimize.regret.portfolio.objectives import ObjectiveBuilder
+
+
+@pytest.fixture(scope="module")
+def cubes():
+    rng = np.random.RandomState(11)
+    return [rng.normal(np.linspace(0.005, 0.02, 4), np.linspace(0.01, 0.06, 4), size=(12, 2000, 4))
+            for _ in range(2)]
+
+
+def assert_gradients(funcs, w, eps=1e-6):
+    grads = []
+    for fn in funcs:
+        grad = np.empty(len(w))
+        fn(w, grad)
+        expected = [(fn(w + e) - fn(w - e)) / (2 * eps) for e in np.eye(len(w)) * eps]
+        assert_allclose(grad, expected, atol=1e-6)
+        grads.append(grad)
+    return grads
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+def test_portfolio_regret_gradients(cubes, rebalance):
+    w = np.array([0.1, 0.2, 0.3, 0.4])
+    objectives = ObjectiveBuilder(cubes, None, rebalance, 4)
+    constraints = ConstraintBuilder(cubes, None, rebalance, 4)
+
+    for funcs in (objectives.max_cvar(5.0), objectives.max_returns, objectives.max_sharpe_ratio,
+                  objectives.min_vol, constraints.max_vol(0.1), constraints.max_cvar(-0.2),
+                  constraints.min_returns(0.01)):
+        assert_gradients(funcs, w)
+
+
+@pytest.mark.parametrize("rebalance", [True, False])
+@pytest.mark.parametrize("active", [True, False])
+def test_active_regret_gradients(cubes, rebalance, active):
+    w = np.array([1.0, 0.1, -0.05, 0.2])
+    objectives = ActiveObjectiveBuilder(cubes, None, rebalance, 4)
+    constraints = ActiveConstraintBuilder(cubes, None, rebalance, 4)
+
+    for funcs in (objectives.max_cvar(5.0, active), objectives.min_vol(active), constraints.max_vol(0.03, active),
+                  constraints.max_cvar(-0.2, 5.0, active), constraints.min_returns(0.01, active)):
+        for grad in assert_gradients(funcs, w):
+            if active:
+                assert grad[0] == 0
+
+    for grad in assert_gradients(objectives.max_info_ratio, w):
+        assert grad[0] == 0
+    assert_gradients(objectives.max_returns, w)
+    assert_gradients(objectives.max_sharpe_ratio, w)
@@ -0,0 +1,181 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_almost_equal
+
+from allopy import BaseOptimizer, OptData, PortfolioRegretOptimizer, RegretOptimizer
+from allopy.optimize.regret import _operations
+from allopy.optimize.regret.result import RegretResult
+
+
+def _linear_objective(mu):
+    def obj_fun(w):
+        return mu @ w
+
+    return obj_fun
+
+
+def _quadratic_objective(mu, cov):
+    def obj_fun(w, grad=None):
+        if grad is not None and grad.size > 0:
+            grad[:] = mu - cov @ w
+        return mu @ w - 0.5 * w @ cov @ w
+
+    return obj_fun
+
+
+_MUS = np.array([[0.04, 0.01, 0.02],
+                 [0.01, 0.05, 0.02],
+                 [0.02, 0.02, 0.03]])
+_COV = np.array([[0.04, 0.01, 0.0],
+                 [0.01, 0.09, 0.02],
+                 [0.0, 0.02, 0.06]])
+
+
+def _solve_regret(objectives, approx):
+    opt = RegretOptimizer(3, 3, sum_to_1=True)
+    opt.set_bounds(0, 0.6)
+    opt.set_max_objective(objectives)
+    return opt.optimize(approx=approx, random_state=1)
+
+
+@pytest.mark.parametrize("approx", [True, False])
+@pytest.mark.parametrize("objective", ["linear", "quadratic"])
+def test_regret_fast_paths_match_generic_path(monkeypatch, objective, approx):
+    if objective == "linear":
+        objectives = [_linear_objective(mu) for mu in _MUS]
+    else:
+        objectives = [_quadratic_objective(mu, _COV) for mu in _MUS]
+        # not affine, so the probe must fall back to the analytic square regret
+        solutions = np.array([[0.6, 0.4, 0.0], [0.0, 0.6, 0.4], [0.2, 0.4, 0.4]])
+        f_values = np.array([f(s) for f, s in zip(objectives, solutions)])
+        assert _operations._affine_coefficients(objectives, solutions, f_values) is None
+
+    w = _solve_regret(objectives, approx)
+
+    monkeypatch.setattr(_operations, "_affine_coefficients", lambda *args, **kwargs: None)
+    monkeypatch.setattr(_operations, "_has_square_regret_gradient", lambda *args: False)
+    assert_almost_equal(_solve_regret(objectives, approx), w, 4)
+
+
+def test_affine_coefficients():
+    solutions = np.array([[0.6, 0.4, 0.0], [0.0, 0.6, 0.4], [0.2, 0.4, 0.4]])
+    funcs = [lambda w, mu=mu, c=c: mu @ w + c for mu, c in zip(_MUS, [0.0, 0.01, -0.02])]
+    f_values = np.array([f(s) for f, s in zip(funcs, solutions)])
+
+    A, b = _operations._affine_coefficients(funcs, solutions, f_values)
+    assert_almost_equal(A, _MUS)
+    assert_almost_equal(b, [0.0, 0.01, -0.02])
+
+
+
+def test_affine_coefficients_rejects_piecewise_linear_objectives():
+    # each objective has a kink that only the solution two scenarios ahead reaches, so checking a scenario's
+    # objective at its own and the next scenario's solution is not enough to catch it
+    solutions = np.array([[0.6, 0.4, 0.0], [0.0, 0.6, 0.4], [0.4, 0.0, 0.6]])
+    funcs = [lambda w, mu=mu, j=j: mu @ w - max(0, w[j] - 0.55) for mu, j in zip(_MUS, [2, 0, 1])]
+    f_values = np.array([f(s) for f, s in zip(funcs, solutions)])
+
+    assert _operations._affine_coefficients(funcs, solutions, f_values) is None
+
+def test_square_regret_matches_generic_regret():
+    objectives = [_quadratic_objective(mu, _COV) for mu in _MUS]
+    solutions = np.array([[0.6, 0.4, 0.0], [0.0, 0.6, 0.4], [0.2, 0.4, 0.4]])
+    f_values = np.array([f(s) for f, s in zip(objectives, solutions)])
+    prob = np.array([0.2, 0.5, 0.3])
+    regret = _operations._square_regret(objectives, f_values, prob, 3)
+
+    def generic(w):
+        return prob @ (f_values - [f(w) for f in objectives]) ** 2
+
+    w, eps = np.array([0.3, 0.3, 0.4]), 1e-6
+    grad = np.empty(3)
+    assert_almost_equal(regret(w, grad), generic(w))
+    assert_almost_equal(regret(w), generic(w))
+    assert_almost_equal(grad, [(generic(w + e) - generic(w - e)) / (2 * eps) for e in np.eye(3) * eps])
+
+
+@pytest.mark.parametrize("approx", [True, False])
+def test_regret_optimizer_linear_objectives(approx):
+    mus = np.array([[0.04, 0.01, 0.02],
+                    [0.01, 0.05, 0.02],
+                    [0.02, 0.02, 0.03]])
+
+    opt = RegretOptimizer(3, 3, sum_to_1=True)
+    opt.set_bounds(0, 0.6)
+    opt.set_max_objective([_linear_objective(mu) for mu in mus])
+    w = opt.optimize(approx=approx, random_state=1)
+
+    assert np.isclose(w.sum(), 1)
+    assert np.all(w >= -1e-6) and np.all(w <= 0.6 + 1e-6)
+    assert np.isfinite(opt.result.regret_value)
+
+
+@pytest.mark.parametrize("sum_to_1", [True, False])
+def test_actual_regret_weights_sum_to_1(sum_to_1):
+    opt = RegretOptimizer(3, 3, sum_to_1=sum_to_1)
+    opt.set_bounds(0, 0.6)
+    opt.set_max_objective([_linear_objective(mu) for mu in _MUS])
+    w = opt.optimize(approx=False, random_state=1)
+
+    if sum_to_1:
+        assert np.isclose(w.sum(), 1)
+    else:
+        # every scenario is best off fully invested at the upper bounds, which the final weights must not leave
+        assert_almost_equal(w, 0.6, 4)
+
+
+def test_portfolio_regret_optimizer_accepts_arrays():
+    rng = np.random.RandomState(8)
+    cubes = [rng.normal(np.linspace(0.005, 0.02, 4), np.linspace(0.01, 0.06, 4), size=(12, 400, 4))
+             for _ in range(2)]
+
+    opt = PortfolioRegretOptimizer(cubes)
+    assert all(isinstance(d, OptData) for d in opt._objectives.data)
+    assert opt._objectives.num_assets == 4
+    assert len(opt.lower_bounds) == 4
+
+    opt.set_bounds(0, 0.6)
+    w = opt.maximize_returns(max_vol=0.1, random_state=1)
+    assert np.isclose(w.sum(), 1)
+
+
+def test_scenarios_warm_start_from_last_solution():
+    starts = {}
+
+    def recording(index, mu):
+        def obj_fun(w):
+            starts.setdefault(index, w.copy())
+            return mu @ w
+
+        return obj_fun
+
+    opt = RegretOptimizer(3, 3, sum_to_1=True)
+    opt.set_bounds(0, 0.6)
+    opt.set_max_objective([recording(i, mu) for i, mu in enumerate(_MUS)])
+    opt.optimize(random_state=1)
+
+    # with the default random initial solution, every scenario after the first starts where the last one ended
+    solutions = opt.solution.scenario_optimal
+    for i in range(1, 3):
+        assert_almost_equal(starts[i], solutions[i - 1], 5)
+
+
+def test_constraints_evaluated_with_a_gradient_buffer():
+    # the feasibility checks and the result evaluate the constraints outside of NLopt, they must give a buffer the
+    # constraint can write its gradient into
+    def cap(w, grad):
+        grad[:] = [1, 0, 0]
+        return w[0] - 0.5
+
+    model = BaseOptimizer(3)
+    model.set_bounds(0, 1)
+    model.add_inequality_constraint(cap)
+    assert _operations._is_feasible(model, np.array([0.4, 0.3, 0.3]), 1e-6)
+    assert not _operations._is_feasible(model, np.array([0.6, 0.2, 0.2]), 1e-6)
+
+    opt = RegretOptimizer(3, 3, sum_to_1=True)
+    opt.set_max_objective([_linear_objective(mu) for mu in _MUS])
+    opt.add_inequality_constraint(cap)
+    solutions = np.array([[0.5, 0.5, 0.0], [0.0, 0.6, 0.4], [0.2, 0.4, 0.4]])
+    result = RegretResult(opt._mb, np.array([0.6, 0.2, 0.2]), solutions, None, np.square, opt.prob)
+    assert len(result.violations) == 3
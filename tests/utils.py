@@ -1,5 +1,7 @@
+import json
 import os
 import pickle
+import shutil
 from base64 import b64encode
 from pathlib import Path
 from typing import Optional
@@ -38,7 +40,7 @@ def fetch_opt_data_test_file(name: str) -> Optional[OptData]:
         p.mkdir(777, True, True)
 
     fp = p.joinpath(name)
-    if not fp.exists():
+    if not _is_complete(fp):
         ok = download_from_1drv(_files[name], fp.as_posix())
         if not ok:
             return None
@@ -58,11 +60,38 @@ def download_from_1drv(src_url: str, save_file_path: str):
     if link is None:
         raise ValueError("download url not available in file meta data")
 
-    r = requests.get(link)
-    if r.status_code != 200:
-        return False
+    # the file is streamed to disk instead of being held in memory. It is written under a temporary name and only
+    # moved into place once complete so that an interrupted download is never mistaken for the data file
+    part_path = save_file_path + ".part"
+    with requests.get(link, stream=True) as r:
+        if r.status_code != 200:
+            return False
+
+        r.raw.decode_content = True
+        with open(part_path, 'wb') as f:
+            shutil.copyfileobj(r.raw, f, 1 << 20)
 
-    with open(save_file_path, 'wb') as f:
-        f.write(r.content)
+        meta = {"size": os.path.getsize(part_path)}
+
+    os.replace(part_path, save_file_path)
+    with open(_meta_path(save_file_path), 'w') as f:
+        json.dump(meta, f)
 
     return True
+
+
+def _meta_path(file_path) -> str:
+    return f"{file_path}.meta.json"
+
+
+def _is_complete(fp: Path) -> bool:
+    """Checks that the file exists and has the size recorded when it was downloaded, if any was recorded"""
+    if not fp.exists():
+        return False
+
+    meta_path = _meta_path(fp.as_posix())
+    if not os.path.exists(meta_path):
+        return True
+
+    with open(meta_path) as f:
+        return json.load(f).get("size") == fp.stat().st_size